@@ -6,10 +6,15 @@ Handles note normalization, entity extraction, and indexing
 import asyncio
 import hashlib
 import logging
+import os
+import re
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+import orjson
+
 from google.adk import Agent, Tool, Memory
 from google.adk.agents import AgentConfig
 
@@ -21,6 +26,24 @@ from memory.adapters.pgvector import PgVectorAdapter
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r'\S+')
+_WIKILINK_RE = re.compile(r'\[\[([^\]]+)\]\]')
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+
+def _detect_device() -> str:
+    """Pick the fastest available torch backend for the embedding model"""
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
 
 class IngestionAgent(Agent):
     """
@@ -38,9 +61,10 @@ class IngestionAgent(Agent):
         super().__init__(config)
         
         # Initialize tools
+        self.embedding_device = config.get("embedding_device") or _detect_device()
         self.note_creation_tool = NoteCreationTool()
         self.entity_extraction_tool = EntityExtractionTool()
-        self.vector_search_tool = VectorSearchTool()
+        self.vector_search_tool = VectorSearchTool(device=self.embedding_device)
         
         # Initialize memory adapters
         self.graph_db = Neo4jAdapter()
@@ -49,6 +73,45 @@ class IngestionAgent(Agent):
         # Configuration
         self.max_content_length = config.get("max_content_length", 100000)
         self.embedding_model = config.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+        # Embeddings are stored as float16 (pgvector halfvec) by default
+        self.embedding_dtype = np.dtype(config.get("embedding_dtype", "float16"))
+        self.db_pool_min_size = config.get("db_pool_min_size", 4)
+        self.db_pool_max_size = config.get("db_pool_max_size", 32)
+        self.max_batch_chars = config.get("embedding_max_batch_chars", 150000)
+        self.max_batch_size = config.get("embedding_max_batch_size", 8)
+        self.oom_fallback_count = 0
+        self.reindex_concurrency = config.get("reindex_concurrency", 8)
+        self.wal_path = config.get("wal_path", "reindex.wal")
+        self.wal_sync_interval = config.get("wal_sync_interval", 100)
+        # WAL entries only count for the same model/storage settings, so a model or
+        # chunking change forces a full reindex
+        self.index_version = config.get(
+            "index_version",
+            f"{self.embedding_model}|{self.embedding_dtype.name}|"
+            f"{self.max_content_length}|{self.max_batch_chars}|{self.max_batch_size}"
+        )
+    
+    async def connect(self):
+        """Open pooled connections so adapter calls reuse sessions"""
+        await asyncio.gather(
+            self.graph_db.connect(max_connection_pool_size=self.db_pool_max_size),
+            self.vector_db.connect(min_size=self.db_pool_min_size, max_size=self.db_pool_max_size)
+        )
+    
+    async def startup(self):
+        """Warm up the embedding model and open database pools on boot"""
+        await asyncio.gather(
+            self.vector_search_tool.warmup(),
+            self.connect()
+        )
+    
+    async def aclose(self):
+        """Close pooled database connections"""
+        await asyncio.gather(
+            self.graph_db.close(),
+            self.vector_db.close(),
+            return_exceptions=True
+        )
         
     async def process_note(self, note_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -88,7 +151,7 @@ class IngestionAgent(Agent):
                 "note_id": note_id,
                 "path": note_path,
                 "entities": entities,
-                "embeddings": embeddings,
+                "embeddings": self._embeddings_to_lists(embeddings),
                 "explicit_links": explicit_links,
                 "processing_time": datetime.now().isoformat(),
                 "status": "success"
@@ -126,7 +189,7 @@ class IngestionAgent(Agent):
                 "frontmatter": frontmatter_data,
                 "content": body_content,
                 "sections": sections,
-                "word_count": len(body_content.split()),
+                "word_count": sum(1 for _ in _WORD_RE.finditer(body_content)),
                 "checksum": hashlib.sha256(content.encode()).hexdigest()
             }
             
@@ -213,29 +276,84 @@ class IngestionAgent(Agent):
             logger.error(f"Failed to extract entities: {str(e)}")
             return []
     
-    async def _generate_embeddings(self, note: Dict[str, Any]) -> Dict[str, List[float]]:
+    def _to_storage_vector(self, embedding: Any) -> np.ndarray:
+        """Cast a model embedding to the compact dtype used for storage"""
+        return np.asarray(embedding, dtype=self.embedding_dtype)
+    
+    @staticmethod
+    def _embeddings_to_lists(embeddings: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-safe copy of the embeddings for the tool response (arrays stay storage-side)"""
+        content = embeddings.get("content")
+        result = {} if content is None else {"content": content.tolist()}
+        if "sections" in embeddings:
+            result["sections"] = [
+                {**section_emb, "embedding": section_emb["embedding"].tolist()}
+                for section_emb in embeddings["sections"]
+            ]
+        return result
+    
+    async def _embed_texts(self, texts: List[str]) -> List[Any]:
+        """Embed texts in length-sorted batches bounded by characters and count"""
+        batches: List[List[int]] = []
+        batch_chars = 0
+        for i in sorted(range(len(texts)), key=lambda i: len(texts[i])):
+            text_chars = len(texts[i])
+            if not batches or (batch_chars + text_chars > self.max_batch_chars
+                               or len(batches[-1]) >= self.max_batch_size):
+                batches.append([])
+                batch_chars = 0
+            batches[-1].append(i)
+            batch_chars += text_chars
+        
+        embeddings: List[Any] = [None] * len(texts)
+        for batch in batches:
+            vectors = await self._embed_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+        
+        return embeddings
+    
+    async def _embed_batch(self, texts: List[str]) -> List[Any]:
+        """Embed a batch, halving it on GPU out-of-memory errors"""
+        try:
+            return list(await self.vector_search_tool.generate_embeddings(texts))
+        except RuntimeError as e:
+            if "out of memory" not in str(e).lower() or len(texts) == 1:
+                raise
+            
+            try:
+                import torch
+                torch.cuda.empty_cache()
+            except ImportError:
+                pass
+            
+            self.oom_fallback_count += 1
+            logger.warning(f"Embedding batch of {len(texts)} ran out of memory, "
+                           f"splitting (fallback #{self.oom_fallback_count})")
+            
+            mid = len(texts) // 2
+            return await self._embed_batch(texts[:mid]) + await self._embed_batch(texts[mid:])
+    
+    async def _generate_embeddings(self, note: Dict[str, Any]) -> Dict[str, Any]:
         """Generate embeddings for note content and sections"""
         try:
             embeddings = {}
+            sections = [section for section in note["sections"] if section["content"].strip()]
             
-            # Generate embedding for full content
-            content_embedding = await self.vector_search_tool.generate_embedding(
-                note["content"]
+            # Embed full content and all sections in as few batches as possible
+            vectors = await self._embed_texts(
+                [note["content"]] +
+                [f"{section['heading']}\n{section['content']}" for section in sections]
             )
-            embeddings["content"] = content_embedding
+            embeddings["content"] = self._to_storage_vector(vectors[0])
             
-            # Generate embeddings for sections
             section_embeddings = []
-            for section in note["sections"]:
-                if section["content"].strip():
-                    section_emb = await self.vector_search_tool.generate_embedding(
-                        f"{section['heading']}\n{section['content']}"
-                    )
-                    section_embeddings.append({
-                        "heading": section["heading"],
-                        "level": section["level"],
-                        "embedding": section_emb
-                    })
+            for section, section_emb in zip(sections, vectors[1:]):
+                section_embeddings.append({
+                    "heading": section["heading"],
+                    "level": section["level"],
+                    "embedding": self._to_storage_vector(section_emb)
+                })
             
             embeddings["sections"] = section_embeddings
             
@@ -246,7 +364,7 @@ class IngestionAgent(Agent):
             return {}
     
     async def _persist_note(self, note: Dict[str, Any], entities: List[Dict[str, Any]], 
-                          embeddings: Dict[str, List[float]]) -> str:
+                          embeddings: Dict[str, Any]) -> str:
         """Persist note to database"""
         try:
             # Create note in graph database
@@ -259,8 +377,9 @@ class IngestionAgent(Agent):
                 checksum=note["checksum"]
             )
             
-            # Store embeddings in vector database
-            if embeddings.get("content"):
+            # Store embeddings in vector database (ndarray is passed through
+            # as-is so the driver can use its binary vector encoding)
+            if embeddings.get("content") is not None:
                 await self.vector_db.store_embedding(
                     note_id=note_id,
                     content=note["content"],
@@ -286,22 +405,18 @@ class IngestionAgent(Agent):
                     }
                 )
             
-            # Store entities
-            for entity in entities:
-                await self.graph_db.create_entity(
-                    name=entity["name"],
-                    entity_type=entity["type"],
-                    description=entity.get("description", ""),
-                    aliases=entity.get("aliases", []),
-                    confidence=entity.get("confidence", 0.0)
-                )
-                
-                # Create mention relationship
-                await self.graph_db.create_mention(
+            # Store entities and their mentions in a single round trip
+            if entities:
+                await self.graph_db.upsert_entities_with_mentions(
                     note_id=note_id,
-                    entity_name=entity["name"],
-                    context=entity.get("context", ""),
-                    confidence=entity.get("confidence", 0.0)
+                    entities=[{
+                        "name": entity["name"],
+                        "type": entity["type"],
+                        "description": entity.get("description", ""),
+                        "aliases": entity.get("aliases", []),
+                        "confidence": entity.get("confidence", 0.0),
+                        "context": entity.get("context", "")
+                    } for entity in entities]
                 )
             
             return note_id
@@ -312,14 +427,11 @@ class IngestionAgent(Agent):
     
     async def _extract_explicit_links(self, note: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract explicit links from note content (wikilinks, URLs)"""
-        import re
-        
         explicit_links = []
         content = note["content"]
         
         # Extract wikilinks [[link]]
-        wikilink_pattern = r'\[\[([^\]]+)\]\]'
-        wikilinks = re.findall(wikilink_pattern, content)
+        wikilinks = _WIKILINK_RE.findall(content)
         
         for link in wikilinks:
             explicit_links.append({
@@ -330,8 +442,7 @@ class IngestionAgent(Agent):
             })
         
         # Extract URLs
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        urls = re.findall(url_pattern, content)
+        urls = _URL_RE.findall(content)
         
         for url in urls:
             explicit_links.append({
@@ -343,17 +454,58 @@ class IngestionAgent(Agent):
         
         return explicit_links
     
+    def _load_wal(self) -> set:
+        """Load (path, checksum) pairs already reindexed by a previous run"""
+        done = set()
+        if not os.path.exists(self.wal_path):
+            return done
+        
+        with open(self.wal_path, "rb") as wal:
+            for line in wal:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # A torn final line from an interrupted run
+                    continue
+                if entry.get("v") == self.index_version:
+                    done.add((entry["path"], entry["ck"]))
+        
+        return done
+    
+    def _rewrite_wal(self, entries: List[Tuple[str, str]]):
+        """Atomically replace the WAL with the given (path, checksum) pairs"""
+        tmp_path = self.wal_path + ".tmp"
+        with open(tmp_path, "wb") as wal:
+            for path, checksum in entries:
+                wal.write(orjson.dumps({
+                    "path": path, "ck": checksum, "v": self.index_version
+                }) + b"\n")
+            wal.flush()
+            os.fsync(wal.fileno())
+        os.replace(tmp_path, self.wal_path)
+    
     async def reindex_notes(self) -> Dict[str, Any]:
         """Reindex all notes (maintenance task)"""
         try:
-            # Get all notes from graph database
-            notes = await self.graph_db.get_all_notes()
+            done = self._load_wal()
+            wal = open(self.wal_path, "ab", buffering=0)
+            sync = getattr(os, "fdatasync", os.fsync)
             
             reindexed_count = 0
+            skipped_count = 0
+            total_notes = 0
             errors = []
+            succeeded = []
             
-            for note in notes:
+            async def reindex(note: Dict[str, Any]):
+                nonlocal reindexed_count, skipped_count
                 try:
+                    checksum = hashlib.sha256(note["content"].encode()).hexdigest()
+                    if (note["path"], checksum) in done:
+                        skipped_count += 1
+                        succeeded.append((note["path"], checksum))
+                        return
+                    
                     # Re-process note
                     result = await self.process_note({
                         "path": note["path"],
@@ -362,16 +514,54 @@ class IngestionAgent(Agent):
                     
                     if result["status"] == "success":
                         reindexed_count += 1
+                        succeeded.append((note["path"], checksum))
+                        wal.write(orjson.dumps({
+                            "path": note["path"], "ck": checksum, "v": self.index_version
+                        }) + b"\n")
+                        if reindexed_count % self.wal_sync_interval == 0:
+                            sync(wal.fileno())
                     else:
                         errors.append(f"Failed to reindex {note['path']}: {result.get('error')}")
                         
                 except Exception as e:
-                    errors.append(f"Error reindexing {note['path']}: {str(e)}")
+                    errors.append(f"Error reindexing {note.get('path', 'unknown')}: {str(e)}")
+            
+            def collect(finished: set):
+                # Surface anything that escaped reindex() instead of dropping it
+                for task in finished:
+                    if not task.cancelled() and task.exception() is not None:
+                        errors.append(f"Error reindexing: {str(task.exception())}")
+            
+            pending = set()
+            try:
+                # Stream notes from the graph database with a bounded number in flight
+                async for note in self.graph_db.iter_all_notes():
+                    total_notes += 1
+                    if len(pending) >= self.reindex_concurrency:
+                        finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        collect(finished)
+                    pending.add(asyncio.create_task(reindex(note)))
+                
+                if pending:
+                    finished, pending = await asyncio.wait(pending)
+                    collect(finished)
+            finally:
+                for task in pending:
+                    task.cancel()
+                wal.close()
+            
+            if errors:
+                # Keep only this run's successes so the next reindex retries the failures
+                self._rewrite_wal(succeeded)
+            else:
+                # The run finished cleanly, so the next reindex starts from scratch
+                os.remove(self.wal_path)
             
             return {
                 "status": "completed",
                 "reindexed_count": reindexed_count,
-                "total_notes": len(notes),
+                "skipped_count": skipped_count,
+                "total_notes": total_notes,
                 "errors": errors
             }
             
@@ -8,6 +8,8 @@ import logging
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+import numpy as np
+
 from google.adk import Agent, Tool, Memory
 from google.adk.agents import AgentConfig
 
@@ -18,6 +20,40 @@ from memory.adapters.neo4j import Neo4jAdapter
 
 logger = logging.getLogger(__name__)
 
+try:
+    import numba
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+
+def _score_links(vector_scores: np.ndarray, entity_scores: np.ndarray, entity_counts: np.ndarray,
+                 semantic_weight: float, entity_weight: float,
+                 threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Average entity scores in place, combine with vector scores and select survivors"""
+    entity_scores /= np.maximum(entity_counts, 1.0)
+    confidences = semantic_weight * vector_scores + entity_weight * entity_scores
+    return np.flatnonzero(confidences >= threshold), confidences
+
+
+if _NUMBA_AVAILABLE:
+    @numba.njit(cache=True, fastmath=True)
+    def _score_links_jit(vector_scores, entity_scores, entity_counts,
+                         semantic_weight, entity_weight, threshold):
+        """Single-pass JIT version of _score_links for large candidate pools"""
+        n = vector_scores.shape[0]
+        confidences = np.empty(n, dtype=np.float32)
+        survivors = np.empty(n, dtype=np.int64)
+        kept = 0
+        for i in range(n):
+            if entity_counts[i] > 0:
+                entity_scores[i] /= entity_counts[i]
+            confidences[i] = semantic_weight * vector_scores[i] + entity_weight * entity_scores[i]
+            if confidences[i] >= threshold:
+                survivors[kept] = i
+                kept += 1
+        return survivors[:kept], confidences
+
 
 class LinkingAgent(Agent):
     """
@@ -46,13 +82,22 @@ class LinkingAgent(Agent):
         self.max_similar_notes = config.get("max_similar_notes", 10)
         self.semantic_weight = config.get("semantic_weight", 0.6)
         self.entity_weight = config.get("entity_weight", 0.4)
+        self.refresh_concurrency = config.get("refresh_concurrency", 16)
+        self.numba_min_candidates = config.get("numba_min_candidates", 256)
+        # Store each semantic link once, flagged bidirectional, instead of writing a
+        # reverse edge. Only enable once graph readers and metrics honour the flag.
+        self.single_edge_links = config.get("single_edge_links", False)
     
-    async def process_links(self, ingestion_result: Dict[str, Any]) -> Dict[str, Any]:
+    async def process_links(self, ingestion_result: Dict[str, Any],
+                            entity_cache: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                            similar_notes: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Process links for a newly ingested note
         
         Args:
             ingestion_result: Result from IngestionAgent
+            entity_cache: Optional entity name -> notes cache shared across calls
+            similar_notes: Precomputed vector search results; skips the per-note search
             
         Returns:
             Link processing result with proposed links and confidence scores
@@ -63,13 +108,33 @@ class LinkingAgent(Agent):
             entities = ingestion_result["entities"]
             embeddings = ingestion_result["embeddings"]
             
-            logger.info(f"Processing links for note {note_id}")
+            # Convert the content embedding to a contiguous float32 array once
+            content_embedding = embeddings.get("content")
+            if content_embedding is not None:
+                content_embedding = np.ascontiguousarray(content_embedding, dtype=np.float32)
             
-            # 1. Find similar notes using vector search
-            similar_notes = await self._find_similar_notes(note_id, embeddings)
+            logger.info(f"Processing links for note {note_id}")
             
-            # 2. Find entity-based connections
-            entity_connections = await self._find_entity_connections(note_id, entities)
+            # 1-2. Find similar notes (vector search) and entity-based connections concurrently;
+            # a failed lookup is logged and treated as empty so the other can still propose links
+            if similar_notes is None:
+                similar_notes, entity_connections = await asyncio.gather(
+                    self._find_similar_notes(note_id, content_embedding),
+                    self._find_entity_connections(note_id, entities, entity_cache),
+                    return_exceptions=True
+                )
+                if isinstance(similar_notes, Exception):
+                    logger.error(f"Failed to find similar notes: {str(similar_notes)}")
+                    similar_notes = []
+                if isinstance(entity_connections, Exception):
+                    logger.error(f"Failed to find entity connections: {str(entity_connections)}")
+                    entity_connections = {}
+            else:
+                try:
+                    entity_connections = await self._find_entity_connections(note_id, entities, entity_cache)
+                except Exception as e:
+                    logger.error(f"Failed to find entity connections: {str(e)}")
+                    entity_connections = {}
             
             # 3. Combine and score potential links
             potential_links = await self._combine_and_score_links(
@@ -107,168 +172,202 @@ class LinkingAgent(Agent):
                 "status": "error"
             }
     
-    async def _find_similar_notes(self, note_id: str, embeddings: Dict[str, List[float]]) -> List[Dict[str, Any]]:
+    async def _find_similar_notes(self, note_id: str,
+                                  content_embedding: Optional[np.ndarray]) -> List[Dict[str, Any]]:
         """Find similar notes using vector similarity"""
-        try:
-            content_embedding = embeddings.get("content")
-            if not content_embedding:
-                return []
-            
-            # Search for similar notes
-            similar_notes = await self.vector_search_tool.search(
-                embedding=content_embedding,
-                k=self.max_similar_notes,
-                exclude_note_id=note_id
-            )
-            
-            return similar_notes
-            
-        except Exception as e:
-            logger.error(f"Failed to find similar notes: {str(e)}")
+        if content_embedding is None or content_embedding.size == 0:
             return []
+        
+        # Search for similar notes
+        similar_notes = await self.vector_search_tool.search(
+            embedding=content_embedding,
+            k=self.max_similar_notes,
+            exclude_note_id=note_id
+        )
+        
+        return similar_notes
     
-    async def _find_entity_connections(self, note_id: str, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Find connections based on shared entities"""
-        try:
-            connections = []
-            
-            for entity in entities:
-                entity_name = entity["name"]
-                entity_type = entity["type"]
-                
-                # Find other notes that mention this entity
-                related_notes = await self.graph_db.find_notes_by_entity(entity_name)
-                
-                for related_note in related_notes:
-                    if related_note["note_id"] != note_id:
-                        connections.append({
-                            "target_note_id": related_note["note_id"],
-                            "target_note_path": related_note["path"],
-                            "shared_entity": entity_name,
-                            "entity_type": entity_type,
-                            "confidence": entity.get("confidence", 0.5)
-                        })
-            
+    async def _find_entity_connections(self, note_id: str, entities: List[Dict[str, Any]],
+                                       entity_cache: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Find connections based on shared entities, grouped by target note"""
+        connections: Dict[str, Dict[str, Any]] = {}
+        if not entities:
             return connections
-            
-        except Exception as e:
-            logger.error(f"Failed to find entity connections: {str(e)}")
-            return []
+        
+        # Deduplicate by name, the key notes are looked up by, keeping the
+        # type of the highest-confidence mention
+        unique: Dict[str, Tuple[str, float]] = {}
+        for entity in entities:
+            confidence = entity.get("confidence", 0.5)
+            current = unique.get(entity["name"])
+            if current is None or confidence > current[1]:
+                unique[entity["name"]] = (entity["type"], confidence)
+        
+        notes_by_entity = entity_cache if entity_cache is not None else {}
+        
+        # Find other notes that mention any uncached entity in one query
+        missing = [name for name in unique if name not in notes_by_entity]
+        if missing:
+            fetched = await self.graph_db.find_notes_by_entities(missing)
+            for name in missing:
+                notes_by_entity[name] = fetched.get(name, [])
+        
+        # Group shared entities per target note in a single pass
+        for name, (entity_type, confidence) in unique.items():
+            shared = {
+                "name": name,
+                "type": entity_type,
+                "confidence": confidence
+            }
+            for related_note in notes_by_entity.get(name, []):
+                target_id = related_note["note_id"]
+                if target_id == note_id:
+                    continue
+                
+                connection = connections.get(target_id)
+                if connection is None:
+                    connection = connections[target_id] = {
+                        "target_note_path": related_note["path"],
+                        "shared_entities": []
+                    }
+                connection["shared_entities"].append(shared)
+        
+        return connections
     
     async def _combine_and_score_links(self, similar_notes: List[Dict[str, Any]], 
-                                     entity_connections: List[Dict[str, Any]], 
+                                     entity_connections: Dict[str, Dict[str, Any]], 
                                      source_note_id: str) -> List[Dict[str, Any]]:
         """Combine vector and entity similarities and score potential links"""
-        try:
-            # Create a map of target notes with their scores
-            link_scores = {}
-            
-            # Add vector similarity scores
-            for note in similar_notes:
-                target_id = note["note_id"]
-                vector_score = note["similarity_score"]
-                
-                if target_id not in link_scores:
-                    link_scores[target_id] = {
-                        "target_note_id": target_id,
-                        "target_note_path": note["path"],
-                        "vector_score": vector_score,
-                        "entity_score": 0.0,
-                        "shared_entities": [],
-                        "rationale": []
-                    }
-                
-                link_scores[target_id]["vector_score"] = vector_score
-                link_scores[target_id]["rationale"].append(f"Vector similarity: {vector_score:.3f}")
-            
-            # Add entity connection scores
-            for connection in entity_connections:
-                target_id = connection["target_note_id"]
-                
-                if target_id not in link_scores:
-                    link_scores[target_id] = {
-                        "target_note_id": target_id,
-                        "target_note_path": connection["target_note_path"],
-                        "vector_score": 0.0,
-                        "entity_score": 0.0,
-                        "shared_entities": [],
-                        "rationale": []
-                    }
-                
-                # Accumulate entity scores
-                entity_score = connection["confidence"]
-                link_scores[target_id]["entity_score"] += entity_score
-                link_scores[target_id]["shared_entities"].append({
-                    "name": connection["shared_entity"],
-                    "type": connection["entity_type"],
-                    "confidence": entity_score
-                })
-                link_scores[target_id]["rationale"].append(
-                    f"Shared entity '{connection['shared_entity']}': {entity_score:.3f}"
-                )
-            
-            # Calculate combined confidence scores
-            potential_links = []
-            for target_id, scores in link_scores.items():
-                # Normalize entity score (average of shared entities)
-                if scores["shared_entities"]:
-                    scores["entity_score"] = scores["entity_score"] / len(scores["shared_entities"])
-                
-                # Calculate combined confidence
-                combined_confidence = (
-                    self.semantic_weight * scores["vector_score"] +
-                    self.entity_weight * scores["entity_score"]
+        # Parallel per-target arrays, indexed through index_of
+        index_of: Dict[str, int] = {}
+        target_ids: List[str] = []
+        target_paths: List[str] = []
+        vector_hits: List[bool] = []
+        vector_scores: List[float] = []
+        entity_sums: List[float] = []
+        shared_entities: List[List[Dict[str, Any]]] = []
+        
+        def slot(target_id: str, target_path: str) -> int:
+            idx = index_of.setdefault(target_id, len(target_ids))
+            if idx == len(target_ids):
+                target_ids.append(target_id)
+                target_paths.append(target_path)
+                vector_hits.append(False)
+                vector_scores.append(0.0)
+                entity_sums.append(0.0)
+                shared_entities.append([])
+            return idx
+        
+        # Entity scores are averaged confidences, so they are at most 1.0 and
+        # a candidate's confidence is bounded before any scoring happens
+        threshold = self.link_confidence_threshold
+        
+        # Add vector similarity scores
+        for note in similar_notes:
+            target_id = note["note_id"]
+            vector_score = note["similarity_score"]
+            
+            # Prune hits that cannot reach the threshold even with perfect entity overlap
+            ceiling = self.semantic_weight * vector_score
+            if target_id in entity_connections:
+                ceiling += self.entity_weight
+            if ceiling < threshold:
+                continue
+            
+            idx = slot(target_id, note["path"])
+            vector_hits[idx] = True
+            vector_scores[idx] = vector_score
+        
+        # Add entity connection scores
+        for target_id, connection in entity_connections.items():
+            # Prune entity-only candidates when the entity weight alone cannot cross the threshold
+            if target_id not in index_of and self.entity_weight < threshold:
+                continue
+            
+            idx = slot(target_id, connection["target_note_path"])
+            shared_entities[idx] = connection["shared_entities"]
+            entity_sums[idx] = sum(shared["confidence"] for shared in connection["shared_entities"])
+        
+        # Calculate combined confidence scores for all candidates at once
+        count = len(target_ids)
+        vector_arr = np.asarray(vector_scores, dtype=np.float32)
+        entity_arr = np.asarray(entity_sums, dtype=np.float32)
+        entity_counts = np.fromiter(
+            (len(shared) for shared in shared_entities), dtype=np.float32, count=count
+        )
+        
+        # Normalize entity score (average of shared entities), combine and
+        # keep only links above the threshold
+        score = _score_links
+        if _NUMBA_AVAILABLE and count >= self.numba_min_candidates:
+            score = _score_links_jit
+        survivors, confidences = score(
+            vector_arr, entity_arr, entity_counts,
+            self.semantic_weight, self.entity_weight, self.link_confidence_threshold
+        )
+        
+        # Keep only the top-K survivors (partial selection instead of a full sort)
+        if len(survivors) > self.max_similar_notes:
+            top = np.argpartition(-confidences[survivors], self.max_similar_notes - 1)
+            survivors = survivors[top[:self.max_similar_notes]]
+        
+        # Emit survivors sorted by confidence score; rationale strings are
+        # built for these survivors only
+        potential_links = []
+        for i in survivors[np.argsort(-confidences[survivors], kind="stable")]:
+            potential_links.append({
+                "source_note_id": source_note_id,
+                "target_note_id": target_ids[i],
+                "target_note_path": target_paths[i],
+                "confidence": float(confidences[i]),
+                "vector_score": float(vector_arr[i]),
+                "entity_score": float(entity_arr[i]),
+                "shared_entities": shared_entities[i],
+                "rationale": self._format_rationale(
+                    vector_scores[i] if vector_hits[i] else None, shared_entities[i]
                 )
-                
-                potential_links.append({
-                    "source_note_id": source_note_id,
-                    "target_note_id": target_id,
-                    "target_note_path": scores["target_note_path"],
-                    "confidence": combined_confidence,
-                    "vector_score": scores["vector_score"],
-                    "entity_score": scores["entity_score"],
-                    "shared_entities": scores["shared_entities"],
-                    "rationale": "; ".join(scores["rationale"])
-                })
-            
-            # Sort by confidence score
-            potential_links.sort(key=lambda x: x["confidence"], reverse=True)
-            
-            return potential_links
-            
-        except Exception as e:
-            logger.error(f"Failed to combine and score links: {str(e)}")
-            return []
+            })
+        
+        return potential_links
+    
+    @staticmethod
+    def _format_rationale(vector_score: Optional[float], shared_entities: List[Dict[str, Any]]) -> str:
+        """Format the human-readable rationale for a surviving link"""
+        parts = [] if vector_score is None else [f"Vector similarity: {vector_score:.3f}"]
+        parts.extend(f"Shared entity '{shared['name']}': {shared['confidence']:.3f}" for shared in shared_entities)
+        return "; ".join(parts)
     
     async def _create_pending_links(self, note_id: str, high_confidence_links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Create pending links for human approval"""
-        try:
-            pending_links = []
-            
-            for link in high_confidence_links:
-                pending_link = await self.graph_db.create_pending_link(
-                    source_note_id=note_id,
-                    target_note_id=link["target_note_id"],
-                    confidence=link["confidence"],
-                    rationale=link["rationale"],
-                    link_type="semantic"
-                )
-                
-                pending_links.append({
-                    "pending_link_id": pending_link["id"],
-                    "source_note_id": note_id,
-                    "target_note_id": link["target_note_id"],
-                    "target_note_path": link["target_note_path"],
-                    "confidence": link["confidence"],
-                    "rationale": link["rationale"],
-                    "status": "pending"
-                })
-            
+        pending_links = []
+        if not high_confidence_links:
             return pending_links
-            
+        
+        # Insert all pending links in one batch; ids come back in row order
+        try:
+            created = await self.graph_db.create_pending_links([{
+                "source_note_id": note_id,
+                "target_note_id": link["target_note_id"],
+                "confidence": link["confidence"],
+                "rationale": link["rationale"],
+                "link_type": "semantic"
+            } for link in high_confidence_links])
         except Exception as e:
             logger.error(f"Failed to create pending links: {str(e)}")
-            return []
+            return pending_links
+        
+        for link, pending_link in zip(high_confidence_links, created):
+            pending_links.append({
+                "pending_link_id": pending_link["id"],
+                "source_note_id": note_id,
+                "target_note_id": link["target_note_id"],
+                "target_note_path": link["target_note_path"],
+                "confidence": link["confidence"],
+                "rationale": link["rationale"],
+                "status": "pending"
+            })
+        
+        return pending_links
     
     async def update_graph(self, linking_result: Dict[str, Any]) -> Dict[str, Any]:
         """Update graph with approved links"""
@@ -276,37 +375,47 @@ class LinkingAgent(Agent):
             note_id = linking_result["note_id"]
             high_confidence_links = linking_result["high_confidence_links"]
             
-            # Update graph with high-confidence links
+            # Update graph with high-confidence links in a single batched upsert
             updated_links = []
+            edges = []
             for link in high_confidence_links:
-                # Create bidirectional link
-                await self.graph_update_tool.upsert_edges(
-                    note_id=note_id,
-                    edges=[{
+                if self.single_edge_links:
+                    # One edge, matched undirected by flag-aware readers
+                    edges.append({
+                        "source_id": note_id,
+                        "target_id": link["target_note_id"],
+                        "relationship": "LINKS_TO",
+                        "confidence": link["confidence"],
+                        "rationale": link["rationale"],
+                        "source": "AUTO",
+                        "bidirectional": True
+                    })
+                else:
+                    # Create bidirectional link
+                    edges.append({
+                        "source_id": note_id,
                         "target_id": link["target_note_id"],
                         "relationship": "LINKS_TO",
                         "confidence": link["confidence"],
                         "rationale": link["rationale"],
                         "source": "AUTO"
-                    }]
-                )
-                
-                # Create reverse link
-                await self.graph_update_tool.upsert_edges(
-                    note_id=link["target_note_id"],
-                    edges=[{
+                    })
+                    
+                    # Create reverse link
+                    edges.append({
+                        "source_id": link["target_note_id"],
                         "target_id": note_id,
                         "relationship": "LINKS_TO",
                         "confidence": link["confidence"],
                         "rationale": f"Reverse of: {link['rationale']}",
                         "source": "AUTO"
-                    }]
-                )
+                    })
                 
                 updated_links.append(link["target_note_id"])
             
-            # Update hub/authority metrics
-            await self._update_hub_authority_metrics(note_id)
+            # Write the edges and recompute hub/authority metrics for this note and
+            # every linked neighbor in the same transaction
+            await self.graph_update_tool.upsert_edges_and_recompute_metrics(note_id, edges)
             
             result = {
                 "note_id": note_id,
@@ -327,27 +436,6 @@ class LinkingAgent(Agent):
                 "status": "error"
             }
     
-    async def _update_hub_authority_metrics(self, note_id: str):
-        """Update hub and authority metrics for graph view"""
-        try:
-            # Calculate hub score (outgoing links)
-            outgoing_links = await self.graph_db.get_outgoing_links(note_id)
-            hub_score = len(outgoing_links)
-            
-            # Calculate authority score (incoming links)
-            incoming_links = await self.graph_db.get_incoming_links(note_id)
-            authority_score = len(incoming_links)
-            
-            # Update note with metrics
-            await self.graph_db.update_note_metrics(
-                note_id=note_id,
-                hub_score=hub_score,
-                authority_score=authority_score
-            )
-            
-        except Exception as e:
-            logger.error(f"Failed to update hub/authority metrics: {str(e)}")
-    
     async def approve_link(self, pending_link_id: str, approved: bool) -> Dict[str, Any]:
         """Approve or reject a pending link"""
         try:
@@ -356,16 +444,14 @@ class LinkingAgent(Agent):
                 pending_link = await self.graph_db.get_pending_link(pending_link_id)
                 
                 # Create the link
-                await self.graph_update_tool.upsert_edges(
-                    note_id=pending_link["source_note_id"],
-                    edges=[{
-                        "target_id": pending_link["target_note_id"],
-                        "relationship": "LINKS_TO",
-                        "confidence": pending_link["confidence"],
-                        "rationale": pending_link["rationale"],
-                        "source": "MANUAL"
-                    }]
-                )
+                await self.graph_update_tool.upsert_edges_batch([{
+                    "source_id": pending_link["source_note_id"],
+                    "target_id": pending_link["target_note_id"],
+                    "relationship": "LINKS_TO",
+                    "confidence": pending_link["confidence"],
+                    "rationale": pending_link["rationale"],
+                    "source": "MANUAL"
+                }])
                 
                 # Mark as approved
                 await self.graph_db.update_pending_link_status(pending_link_id, "approved")
@@ -399,26 +485,62 @@ class LinkingAgent(Agent):
             # Get all notes
             notes = await self.graph_db.get_all_notes()
             
-            refreshed_count = 0
-            errors = []
+            # Fetch stored entities and embeddings for all notes in one batch
+            # so links are refreshed without re-extracting or re-embedding
+            artifacts = await self.graph_db.get_note_artifacts(
+                [note["note_id"] for note in notes]
+            )
             
-            for note in notes:
-                try:
+            # Run one batched vector search for every note with a content embedding
+            similar_by_note: Dict[str, List[Dict[str, Any]]] = {}
+            content_vectors = {
+                note_id: note_artifacts["embeddings"]["content"]
+                for note_id, note_artifacts in artifacts.items()
+                if note_artifacts.get("embeddings", {}).get("content") is not None
+            }
+            if content_vectors:
+                batch_ids = list(content_vectors)
+                query_vectors = np.ascontiguousarray(
+                    np.stack([content_vectors[note_id] for note_id in batch_ids]), dtype=np.float32
+                )
+                batch_results = await self.vector_search_tool.search_batch(
+                    embeddings=query_vectors,
+                    k=self.max_similar_notes,
+                    exclude_note_ids=batch_ids
+                )
+                similar_by_note = dict(zip(batch_ids, batch_results))
+            
+            # Entity lookups are shared across notes for this refresh cycle only
+            entity_cache: Dict[str, List[Dict[str, Any]]] = {}
+            
+            semaphore = asyncio.Semaphore(self.refresh_concurrency)
+            
+            async def refresh(note: Dict[str, Any]) -> Dict[str, Any]:
+                note_artifacts = artifacts.get(note["note_id"], {})
+                async with semaphore:
                     # Re-process links for this note
-                    result = await self.process_links({
+                    return await self.process_links({
                         "note_id": note["note_id"],
                         "path": note["path"],
-                        "entities": [],  # Will be re-extracted
-                        "embeddings": {}  # Will be re-generated
-                    })
-                    
-                    if result["status"] == "success":
-                        refreshed_count += 1
-                    else:
-                        errors.append(f"Failed to refresh links for {note['path']}: {result.get('error')}")
-                        
-                except Exception as e:
-                    errors.append(f"Error refreshing links for {note['path']}: {str(e)}")
+                        "entities": note_artifacts.get("entities", []),
+                        "embeddings": note_artifacts.get("embeddings", {})
+                    }, entity_cache=entity_cache,
+                       similar_notes=similar_by_note.get(note["note_id"], []))
+            
+            results = await asyncio.gather(
+                *(refresh(note) for note in notes), return_exceptions=True
+            )
+            
+            refreshed_count = 0
+            errors = []
+            
+            for note, result in zip(notes, results):
+                if isinstance(result, Exception):
+                    errors.append(f"Error refreshing links for {note['path']}: {str(result)}")
+                elif result["status"] == "success":
+                    refreshed_count += 1
+                else:
+                    errors.append(f"Failed to refresh links for {note['path']}: {result.get('error')}")
             
             return {
                 "status": "completed",
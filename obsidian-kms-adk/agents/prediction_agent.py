@@ -4,10 +4,21 @@ Interprets user intents and chooses retrieval strategy
 """
 
 import asyncio
+import hashlib
+import heapq
+import itertools
 import logging
+import re
 from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
+from types import MappingProxyType
+
+import ahocorasick
+import ciso8601
+import numpy as np
+import orjson
+from cachetools import LRUCache, TTLCache
 
 from google.adk import Agent, Tool, Memory
 from google.adk.agents import AgentConfig
@@ -19,6 +30,193 @@ from memory.adapters.neo4j import Neo4jAdapter
 
 logger = logging.getLogger(__name__)
 
+# Quoted terms, or runs of Title-case / CamelCase words
+_QUICK_ENTITY_RE = re.compile(r'"([^"]+)"|(\b[A-Z][a-zA-Z0-9_-]+(?:\s+[A-Z][a-zA-Z0-9_-]+)*)')
+_QUICK_ENTITY_STOPWORDS = frozenset({
+    "what", "who", "when", "where", "why", "how", "which", "the", "this", "that",
+    "these", "those", "show", "tell", "give", "list", "can", "does", "did", "are", "was",
+    "note", "notes", "recent", "latest", "all", "my", "explain", "find", "summarize",
+    "compare", "describe", "search", "define", "explore", "discover", "is", "do",
+    "an", "in", "on", "of", "to", "it", "me", "we", "if", "or", "and"
+})
+
+
+try:
+    import numba
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
+try:
+    import bm25s
+    _BM25S_AVAILABLE = True
+except ImportError:
+    _BM25S_AVAILABLE = False
+
+
+def _hybrid_scores(vector_scores: np.ndarray, graph_scores: np.ndarray,
+                   recency_scores: np.ndarray, hub_scores: np.ndarray) -> np.ndarray:
+    """Weighted combination of the hybrid rerank signals"""
+    return 0.4 * vector_scores + 0.3 * graph_scores + 0.2 * recency_scores + 0.1 * hub_scores
+
+
+if _NUMBA_AVAILABLE:
+    @numba.njit(cache=True, fastmath=True)
+    def _hybrid_scores_jit(vector_scores, graph_scores, recency_scores, hub_scores):
+        """Single-pass JIT version of _hybrid_scores for large candidate pools"""
+        n = vector_scores.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for i in range(n):
+            scores[i] = (0.4 * vector_scores[i] + 0.3 * graph_scores[i] +
+                         0.2 * recency_scores[i] + 0.1 * hub_scores[i])
+        return scores
+    
+    @numba.njit(cache=True, fastmath=True)
+    def _node_similarity(embeddings, node, query):
+        """Inner product of one node embedding with the query"""
+        total = 0.0
+        for d in range(query.shape[0]):
+            total += embeddings[node, d] * query[d]
+        return total
+    
+    @numba.njit(cache=True)
+    def _best_first_search(indptr, indices, embeddings, query, entry_points, ef, max_hops):
+        """Greedy best-first expansion over CSR adjacency, keeping the ef most similar nodes.
+        Also returns per-node hop depth, parent and the CSR slot of the edge it was reached by"""
+        num_nodes = indptr.shape[0] - 1
+        visited = np.zeros(num_nodes, dtype=np.bool_)
+        depth = np.zeros(num_nodes, dtype=np.int64)
+        parent = np.full(num_nodes, -1, dtype=np.int64)
+        via = np.full(num_nodes, -1, dtype=np.int64)
+        
+        # Candidates are a max-heap on similarity (negated), results a min-heap of size ef
+        first = np.int64(entry_points[0])
+        similarity = _node_similarity(embeddings, first, query)
+        visited[first] = True
+        candidates = [(-similarity, 0, first)]
+        results = [(similarity, first)]
+        for i in range(1, entry_points.shape[0]):
+            node = np.int64(entry_points[i])
+            if visited[node]:
+                continue
+            visited[node] = True
+            similarity = _node_similarity(embeddings, node, query)
+            heapq.heappush(candidates, (-similarity, 0, node))
+            heapq.heappush(results, (similarity, node))
+            if len(results) > ef:
+                heapq.heappop(results)
+        
+        while candidates:
+            negated, hops, node = heapq.heappop(candidates)
+            # Stop once the best remaining candidate cannot improve the results
+            if len(results) >= ef and -negated < results[0][0]:
+                break
+            if hops >= max_hops:
+                continue
+            for j in range(indptr[node], indptr[node + 1]):
+                neighbor = np.int64(indices[j])
+                if visited[neighbor]:
+                    continue
+                visited[neighbor] = True
+                depth[neighbor] = hops + 1
+                parent[neighbor] = node
+                via[neighbor] = j
+                similarity = _node_similarity(embeddings, neighbor, query)
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, hops + 1, neighbor))
+                    heapq.heappush(results, (similarity, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        
+        # Drain the result heap into arrays ordered by descending similarity
+        count = len(results)
+        node_ids = np.empty(count, dtype=np.int64)
+        scores = np.empty(count, dtype=np.float32)
+        for i in range(count - 1, -1, -1):
+            similarity, node = heapq.heappop(results)
+            node_ids[i] = node
+            scores[i] = similarity
+        return node_ids, scores, depth, parent, via
+    
+    @numba.njit(cache=True)
+    def _direction_optimized_bfs(indptr, indices, sources, max_hops, alpha):
+        """Level-synchronous BFS that switches to bottom-up steps when the frontier is heavy.
+        Also returns per-node hop depth, parent and the CSR slot of the edge it was reached by"""
+        num_nodes = indptr.shape[0] - 1
+        num_edges = indices.shape[0]
+        visited = np.zeros(num_nodes, dtype=np.bool_)
+        depth = np.zeros(num_nodes, dtype=np.int64)
+        parent = np.full(num_nodes, -1, dtype=np.int64)
+        via = np.full(num_nodes, -1, dtype=np.int64)
+        in_frontier = np.zeros(num_nodes, dtype=np.bool_)
+        order = np.empty(num_nodes, dtype=np.int64)
+        count = 0
+        for i in range(sources.shape[0]):
+            if not visited[sources[i]]:
+                visited[sources[i]] = True
+                order[count] = sources[i]
+                count += 1
+        
+        frontier_start = 0
+        frontier_end = count
+        for level in range(1, max_hops + 1):
+            if frontier_start == frontier_end:
+                break
+            
+            frontier_edges = 0
+            for i in range(frontier_start, frontier_end):
+                frontier_edges += indptr[order[i] + 1] - indptr[order[i]]
+            
+            if frontier_edges > num_edges / alpha:
+                # Bottom-up: every unvisited node looks for a parent in the frontier;
+                # valid because the adjacency is symmetric
+                in_frontier[:] = False
+                for i in range(frontier_start, frontier_end):
+                    in_frontier[order[i]] = True
+                for node in range(num_nodes):
+                    if visited[node]:
+                        continue
+                    for j in range(indptr[node], indptr[node + 1]):
+                        if in_frontier[indices[j]]:
+                            visited[node] = True
+                            depth[node] = level
+                            parent[node] = indices[j]
+                            via[node] = j
+                            order[count] = node
+                            count += 1
+                            break
+            else:
+                # Top-down: expand the edges of each frontier node
+                for i in range(frontier_start, frontier_end):
+                    node = order[i]
+                    for j in range(indptr[node], indptr[node + 1]):
+                        neighbor = indices[j]
+                        if not visited[neighbor]:
+                            visited[neighbor] = True
+                            depth[neighbor] = level
+                            parent[neighbor] = node
+                            via[neighbor] = j
+                            order[count] = neighbor
+                            count += 1
+            
+            frontier_start = frontier_end
+            frontier_end = count
+        
+        return order[:count], depth, parent, via
+
+
+def _build_csr(num_nodes: int, sources: np.ndarray, targets: np.ndarray,
+               edge_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Build undirected CSR adjacency (indptr, indices, codes) from edge endpoint arrays,
+    carrying a per-edge code (e.g. relationship type) into both directions"""
+    heads = np.concatenate([sources, targets])
+    tails = np.concatenate([targets, sources])
+    order = np.argsort(heads, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(heads, minlength=num_nodes), out=indptr[1:])
+    codes = np.concatenate([edge_codes, edge_codes])[order]
+    return indptr, np.ascontiguousarray(tails[order], dtype=np.int32), codes
+
 
 class QueryType(Enum):
     """Types of queries the system can handle"""
@@ -41,6 +239,19 @@ class RetrievalStrategy(Enum):
     HIERARCHICAL = "hierarchical"
 
 
+class _PlanCache(TTLCache):
+    """TTL cache that counts capacity evictions"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+    
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
 class PredictionAgent(Agent):
     """
     Prediction Agent interprets user intents and chooses retrieval strategy.
@@ -67,6 +278,146 @@ class PredictionAgent(Agent):
         self.max_candidates = config.get("max_candidates", 20)
         self.rerank_top_k = config.get("rerank_top_k", 10)
         self.graph_walk_max_hops = config.get("graph_walk_max_hops", 3)
+        # Neo4j traversal scores are used as-is; hot sub-graph cosine scores are
+        # mapped onto that scale by a fixed factor and decayed per hop
+        self.hot_walk_score_scale = config.get("hot_walk_score_scale", 1.0)
+        self.graph_walk_hop_decay = config.get("graph_walk_hop_decay", 0.8)
+        self.graph_walk_early_stop_score = config.get("graph_walk_early_stop_score")
+        self.numba_min_candidates = config.get("numba_min_candidates", 256)
+        self.vector_quantization = config.get("vector_quantization")
+        self.coarse_k_factor = config.get("coarse_k_factor", 4)
+        self.coarse_k_min = config.get("coarse_k_min", 64)
+        self.rrf_k = config.get("rrf_k", 60)
+        self.rrf_weights = config.get("rrf_weights", {})
+        
+        # In-process snapshot of the hottest part of the graph (CSR adjacency plus
+        # normalized embeddings), refreshed by update_models when enabled; needs numba
+        # and a graph backend exposing get_graph_version/export_hot_subgraph
+        self.hot_subgraph_refresh = config.get("hot_subgraph_refresh", False)
+        self.hot_subgraph_size = config.get("hot_subgraph_size", 50000)
+        self.hot_search_ef = config.get("hot_search_ef", 64)
+        self.hot_bfs_max_hops = config.get("hot_bfs_max_hops", 2)
+        self.bfs_alpha = config.get("bfs_alpha", 14)
+        self._hot_graph: Optional[Dict[str, Any]] = None
+        
+        # Optional BM25 keyword index over note text for hybrid queries
+        self.bm25 = None
+        self._bm25_backend = "auto"
+        bm25_index_path = config.get("bm25_index_path")
+        if bm25_index_path and _BM25S_AVAILABLE:
+            self.bm25 = bm25s.BM25.load(bm25_index_path, load_corpus=True, mmap=True,
+                                        show_progress=False)
+            if _NUMBA_AVAILABLE:
+                self.bm25.activate_numba_scorer()
+                self._bm25_backend = "numba"
+        
+        # Strategy per query type, built once
+        self._strategy_by_qtype = {
+            QueryType.LOOKUP: RetrievalStrategy.HYBRID,
+            QueryType.COMPARE: RetrievalStrategy.GRAPH_ONLY,
+            QueryType.SYNTHESIZE: RetrievalStrategy.HYBRID,
+            QueryType.EXPLORE: RetrievalStrategy.GRAPH_ONLY,
+            QueryType.TIMELINE: RetrievalStrategy.TEMPORAL,
+            QueryType.CAUSAL: RetrievalStrategy.GRAPH_ONLY,
+            QueryType.DEFINITION: RetrievalStrategy.VECTOR_ONLY,
+            QueryType.HOWTO: RetrievalStrategy.HIERARCHICAL
+        }
+        
+        # Retrieval plan templates per strategy, built once from configuration
+        self._plan_templates = {
+            RetrievalStrategy.VECTOR_ONLY: {
+                "steps": (
+                    "Generate query embedding",
+                    "Search vector database",
+                    "Rerank by relevance",
+                    "Return top candidates"
+                ),
+                "parameters": MappingProxyType({
+                    "k": self.max_candidates,
+                    "rerank_k": self.rerank_top_k
+                })
+            },
+            RetrievalStrategy.GRAPH_ONLY: {
+                "steps": (
+                    "Extract entities from query",
+                    "Find starting nodes",
+                    "Perform graph traversal",
+                    "Score by graph proximity",
+                    "Return top candidates"
+                ),
+                "parameters": MappingProxyType({
+                    "max_hops": self.graph_walk_max_hops,
+                    "traversal_type": "breadth_first",
+                    "relationship_types": ("LINKS_TO", "MENTIONS", "SIMILAR_TO")
+                })
+            },
+            # The keyword leg is only advertised when a BM25 index is loaded
+            RetrievalStrategy.HYBRID: {
+                "steps": (
+                    "Generate query embedding",
+                    "Extract entities from query",
+                    "Parallel: vector search + keyword search + graph traversal"
+                    if self.bm25 is not None else "Parallel: vector search + graph traversal",
+                    "Combine and deduplicate results",
+                    "Fuse rankings with reciprocal rank fusion",
+                    "Return top candidates"
+                ),
+                "parameters": MappingProxyType({
+                    "vector_k": self.max_candidates // 2,
+                    **({"sparse_k": self.max_candidates} if self.bm25 is not None else {}),
+                    "graph_k": self.max_candidates // 2,
+                    "combination_method": "rrf",
+                    "rrf_k": self.rrf_k
+                })
+            },
+            RetrievalStrategy.TEMPORAL: {
+                "steps": (
+                    "Extract temporal entities",
+                    "Search by date ranges",
+                    "Order chronologically",
+                    "Return timeline"
+                ),
+                "parameters": MappingProxyType({
+                    "date_field": "created_at",
+                    "sort_order": "asc",
+                    "group_by": "month"
+                })
+            },
+            RetrievalStrategy.HIERARCHICAL: {
+                "steps": (
+                    "Identify hierarchical structure",
+                    "Find parent/child relationships",
+                    "Traverse hierarchy",
+                    "Return structured results"
+                ),
+                "parameters": MappingProxyType({
+                    "hierarchy_type": "note_sections",
+                    "max_depth": 5
+                })
+            }
+        }
+        
+        # Plan cache for repeated queries
+        self._plan_cache = _PlanCache(
+            maxsize=config.get("plan_cache_size", 2048),
+            ttl=config.get("plan_cache_ttl", 300)
+        )
+        self._plan_cache_hits = 0
+        self._plan_cache_misses = 0
+        
+        # Query embeddings keyed by normalized query text
+        self._embedding_cache = LRUCache(maxsize=config.get("embedding_cache_size", 1024))
+        
+        # Query entities: short queries try a regex first, model extractions are cached
+        self.quick_entity_max_chars = config.get("quick_entity_max_chars", 200)
+        self._entity_cache = LRUCache(maxsize=config.get("entity_cache_size", 1024))
+        
+        # Micro-batching of concurrent query embeddings; the queue and the
+        # background batcher task are created on first use inside the event loop
+        self.embed_batch_size = config.get("embed_batch_size", 32)
+        self.embed_batch_wait_ms = config.get("embed_batch_wait_ms", 15)
+        self._embed_queue: Optional[asyncio.Queue] = None
+        self._embed_batcher_task: Optional[asyncio.Task] = None
         
         # Query classification model (simplified)
         self.query_patterns = {
@@ -79,6 +430,24 @@ class PredictionAgent(Agent):
             QueryType.DEFINITION: ["define", "definition", "meaning", "explain"],
             QueryType.HOWTO: ["how to", "steps", "process", "procedure", "guide"]
         }
+        
+        # Flat (pattern, type index) table and multi-pattern automaton, built once
+        self._qtypes = tuple(self.query_patterns.keys())
+        self._pattern_table = tuple(
+            (pattern, i)
+            for i, patterns in enumerate(self.query_patterns.values())
+            for pattern in patterns
+        )
+        self._pattern_automaton = ahocorasick.Automaton()
+        for pattern, i in self._pattern_table:
+            self._pattern_automaton.add_word(pattern, (i, pattern))
+        self._pattern_automaton.make_automaton()
+        
+        # Finished plans for an explicit query type with no context or
+        # preferences, which depend on nothing else
+        self._fast_plans = {
+            query_type: self._build_plan(query_type, "", {}) for query_type in QueryType
+        }
     
     async def plan_query(self, query_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -94,33 +463,54 @@ class PredictionAgent(Agent):
             query_text = query_data["query"]
             context = query_data.get("context", {})
             preferences = query_data.get("preferences", {})
+            explicit_type = self._coerce_query_type(query_data.get("query_type"))
             
-            logger.info(f"Planning query: {query_text[:100]}...")
-            
-            # 1. Classify query type
-            query_type = await self._classify_query(query_text)
+            logger.info("Planning query: %.100s...", query_text)
             
-            # 2. Determine retrieval strategy
-            strategy = await self._determine_strategy(query_type, query_text, context)
+            # Fast path: an explicit query type with no context or preferences
+            # always yields the same plan
+            if explicit_type is not None and not context and not preferences:
+                fast_plan = self._fast_plans[explicit_type]
+                return {
+                    **fast_plan,
+                    "query": query_text,
+                    "plan": {
+                        **fast_plan["plan"],
+                        "parameters": dict(fast_plan["plan"]["parameters"]),
+                        "steps": list(fast_plan["plan"]["steps"])
+                    },
+                    "expected_results": dict(fast_plan["expected_results"]),
+                    "processing_time": datetime.now().isoformat(),
+                    "status": "success"
+                }
             
-            # 3. Generate retrieval plan
-            plan = await self._generate_retrieval_plan(query_type, strategy, query_text, context)
+            cache_key = self._plan_cache_key(query_text, context, preferences, explicit_type)
+            cached = self._plan_cache.get(cache_key)
+            if cached is not None:
+                self._plan_cache_hits += 1
+                result = orjson.loads(cached)
+                # The key is normalized, so echo this caller's own text
+                result["query"] = query_text
+                result["processing_time"] = datetime.now().isoformat()
+                return result
+            self._plan_cache_misses += 1
             
-            # 4. Estimate expected results
-            expected_results = await self._estimate_results(plan, query_text)
+            # 1. Classify query type, unless the caller already knows it
+            query_type = explicit_type or self._classify_query(query_text)
             
+            # 2-4. Determine strategy, generate the plan and estimate results
             result = {
                 "query": query_text,
-                "query_type": query_type.value,
-                "strategy": strategy.value,
-                "plan": plan,
-                "expected_results": expected_results,
-                "confidence": plan.get("confidence", 0.8),
+                **self._build_plan(query_type, query_text, context),
                 "processing_time": datetime.now().isoformat(),
                 "status": "success"
             }
             
-            logger.info(f"Query planned: {query_type.value} -> {strategy.value}")
+            # Cached as serialized bytes so every hit decodes to a fresh copy
+            plan_bytes = orjson.dumps(result)
+            self._plan_cache[cache_key] = plan_bytes
+            
+            logger.info("Query planned: %s -> %s", result["query_type"], result["strategy"])
             return result
             
         except Exception as e:
@@ -131,22 +521,71 @@ class PredictionAgent(Agent):
                 "status": "error"
             }
     
-    async def _classify_query(self, query_text: str) -> QueryType:
+    def _build_plan(self, query_type: QueryType, query_text: str,
+                    context: Dict[str, Any]) -> Dict[str, Any]:
+        """Determine strategy, generate the retrieval plan and estimate results for a query type"""
+        strategy = self._determine_strategy(query_type, query_text, context)
+        plan = self._generate_retrieval_plan(query_type, strategy, query_text, context)
+        expected_results = self._estimate_results(plan, query_text)
+        
+        return {
+            "query_type": query_type.value,
+            "strategy": strategy.value,
+            "plan": plan,
+            "expected_results": expected_results,
+            "confidence": plan.get("confidence", 0.8)
+        }
+    
+    @staticmethod
+    def _coerce_query_type(value: Any) -> Optional[QueryType]:
+        """Convert a caller-supplied query type to QueryType, ignoring unknown values"""
+        if value is None:
+            return None
+        try:
+            return QueryType(value)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _plan_cache_key(query_text: str, context: Dict[str, Any], preferences: Dict[str, Any],
+                        query_type: Optional[QueryType] = None) -> str:
+        """Hash the normalized query, context, preferences and explicit type into a cache key"""
+        normalized = [
+            " ".join(query_text.lower().split()), context, preferences,
+            query_type.value if query_type else None
+        ]
+        payload = orjson.dumps(
+            normalized, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
+    def plan_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters for the plan cache"""
+        lookups = self._plan_cache_hits + self._plan_cache_misses
+        return {
+            "hits": self._plan_cache_hits,
+            "misses": self._plan_cache_misses,
+            "evictions": self._plan_cache.evictions,
+            "size": self._plan_cache.currsize,
+            "maxsize": self._plan_cache.maxsize,
+            "hit_rate": self._plan_cache_hits / lookups if lookups else 0.0
+        }
+    
+    def _classify_query(self, query_text: str) -> QueryType:
         """Classify the type of query based on text patterns"""
         try:
             query_lower = query_text.lower()
             
-            # Score each query type based on pattern matches
-            scores = {}
-            for query_type, patterns in self.query_patterns.items():
-                score = sum(1 for pattern in patterns if pattern in query_lower)
-                scores[query_type] = score
+            # Score each query type by the distinct patterns found in a single
+            # pass of the automaton over the query
+            scores = [0] * len(self._qtypes)
+            for i, _ in {match for _, match in self._pattern_automaton.iter(query_lower)}:
+                scores[i] += 1
             
             # Find the highest scoring type
-            if scores:
-                best_type = max(scores, key=scores.get)
-                if scores[best_type] > 0:
-                    return best_type
+            best = max(range(len(scores)), key=scores.__getitem__)
+            if scores[best] > 0:
+                return self._qtypes[best]
             
             # Default to lookup if no patterns match
             return QueryType.LOOKUP
@@ -155,23 +594,12 @@ class PredictionAgent(Agent):
             logger.error(f"Failed to classify query: {str(e)}")
             return QueryType.LOOKUP
     
-    async def _determine_strategy(self, query_type: QueryType, query_text: str, 
-                                context: Dict[str, Any]) -> RetrievalStrategy:
+    def _determine_strategy(self, query_type: QueryType, query_text: str, 
+                          context: Dict[str, Any]) -> RetrievalStrategy:
         """Determine the best retrieval strategy for the query type"""
         try:
             # Strategy mapping based on query type
-            strategy_mapping = {
-                QueryType.LOOKUP: RetrievalStrategy.HYBRID,
-                QueryType.COMPARE: RetrievalStrategy.GRAPH_ONLY,
-                QueryType.SYNTHESIZE: RetrievalStrategy.HYBRID,
-                QueryType.EXPLORE: RetrievalStrategy.GRAPH_ONLY,
-                QueryType.TIMELINE: RetrievalStrategy.TEMPORAL,
-                QueryType.CAUSAL: RetrievalStrategy.GRAPH_ONLY,
-                QueryType.DEFINITION: RetrievalStrategy.VECTOR_ONLY,
-                QueryType.HOWTO: RetrievalStrategy.HIERARCHICAL
-            }
-            
-            base_strategy = strategy_mapping.get(query_type, RetrievalStrategy.HYBRID)
+            base_strategy = self._strategy_by_qtype[query_type]
             
             # Adjust strategy based on context
             if context.get("prefer_semantic"):
@@ -187,94 +615,30 @@ class PredictionAgent(Agent):
             logger.error(f"Failed to determine strategy: {str(e)}")
             return RetrievalStrategy.HYBRID
     
-    async def _generate_retrieval_plan(self, query_type: QueryType, strategy: RetrievalStrategy,
-                                     query_text: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _generate_retrieval_plan(self, query_type: QueryType, strategy: RetrievalStrategy,
+                               query_text: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Generate detailed retrieval plan"""
         try:
+            template = self._plan_templates[strategy]
+            parameters = dict(template["parameters"])
+            if strategy is RetrievalStrategy.VECTOR_ONLY:
+                parameters["filters"] = context.get("filters", {})
+            
             plan = {
                 "strategy": strategy.value,
                 "query_type": query_type.value,
-                "parameters": {},
-                "steps": [],
+                "parameters": parameters,
+                "steps": list(template["steps"]),
                 "confidence": 0.8
             }
             
-            if strategy == RetrievalStrategy.VECTOR_ONLY:
-                plan["steps"] = [
-                    "Generate query embedding",
-                    "Search vector database",
-                    "Rerank by relevance",
-                    "Return top candidates"
-                ]
-                plan["parameters"] = {
-                    "k": self.max_candidates,
-                    "rerank_k": self.rerank_top_k,
-                    "filters": context.get("filters", {})
-                }
-                
-            elif strategy == RetrievalStrategy.GRAPH_ONLY:
-                plan["steps"] = [
-                    "Extract entities from query",
-                    "Find starting nodes",
-                    "Perform graph traversal",
-                    "Score by graph proximity",
-                    "Return top candidates"
-                ]
-                plan["parameters"] = {
-                    "max_hops": self.graph_walk_max_hops,
-                    "traversal_type": "breadth_first",
-                    "relationship_types": ["LINKS_TO", "MENTIONS", "SIMILAR_TO"]
-                }
-                
-            elif strategy == RetrievalStrategy.HYBRID:
-                plan["steps"] = [
-                    "Generate query embedding",
-                    "Extract entities from query",
-                    "Parallel: vector search + graph traversal",
-                    "Combine and deduplicate results",
-                    "Rerank using hybrid scoring",
-                    "Return top candidates"
-                ]
-                plan["parameters"] = {
-                    "vector_k": self.max_candidates // 2,
-                    "graph_k": self.max_candidates // 2,
-                    "combination_method": "weighted_average",
-                    "vector_weight": 0.6,
-                    "graph_weight": 0.4
-                }
-                
-            elif strategy == RetrievalStrategy.TEMPORAL:
-                plan["steps"] = [
-                    "Extract temporal entities",
-                    "Search by date ranges",
-                    "Order chronologically",
-                    "Return timeline"
-                ]
-                plan["parameters"] = {
-                    "date_field": "created_at",
-                    "sort_order": "asc",
-                    "group_by": "month"
-                }
-                
-            elif strategy == RetrievalStrategy.HIERARCHICAL:
-                plan["steps"] = [
-                    "Identify hierarchical structure",
-                    "Find parent/child relationships",
-                    "Traverse hierarchy",
-                    "Return structured results"
-                ]
-                plan["parameters"] = {
-                    "hierarchy_type": "note_sections",
-                    "max_depth": 5
-                }
-            
             return plan
             
         except Exception as e:
             logger.error(f"Failed to generate retrieval plan: {str(e)}")
             return {"strategy": "hybrid", "steps": [], "parameters": {}}
     
-    async def _estimate_results(self, plan: Dict[str, Any], query_text: str) -> Dict[str, Any]:
+    def _estimate_results(self, plan: Dict[str, Any], query_text: str) -> Dict[str, Any]:
         """Estimate expected results for the retrieval plan"""
         try:
             strategy = plan["strategy"]
@@ -304,29 +668,126 @@ class PredictionAgent(Agent):
             logger.error(f"Failed to estimate results: {str(e)}")
             return {"estimated_count": 10, "estimated_time": 1.0, "confidence": 0.5}
     
-    async def vector_search(self, query_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _embed_cached(self, query_text: str) -> np.ndarray:
+        """Embed a query, reusing the embedding for repeated normalized text"""
+        normalized = " ".join(query_text.lower().split())
+        key = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        embedding = self._embedding_cache.get(key)
+        if embedding is None:
+            embedding = np.asarray(await self._embed_batched(query_text), dtype=np.float32)
+            self._embedding_cache[key] = embedding
+        return embedding
+    
+    async def _embed_batched(self, query_text: str) -> Any:
+        """Queue a query for the embedding micro-batcher and wait for its vector"""
+        if self._embed_batcher_task is None or self._embed_batcher_task.done():
+            self._embed_queue = asyncio.Queue()
+            self._embed_batcher_task = asyncio.create_task(self._embed_batcher())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._embed_queue.put((query_text, future))
+        return await future
+    
+    async def _embed_batcher(self):
+        """Coalesce concurrent query embeddings into batched model calls"""
+        loop = asyncio.get_running_loop()
+        queue = self._embed_queue
+        
+        while True:
+            # Block for the first query, then collect more until the batch is
+            # full or the wait window closes
+            batch = [await queue.get()]
+            deadline = loop.time() + self.embed_batch_wait_ms / 1000.0
+            while len(batch) < self.embed_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                embeddings = await self.vector_search_tool.generate_embeddings(
+                    [text for text, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Failed to embed query batch: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+    
+    async def startup(self):
+        """Warm up the query embedding model so the first query is not a cold load"""
+        await self.vector_search_tool.warmup()
+    
+    async def aclose(self):
+        """Stop the embedding micro-batcher and fail any queued queries"""
+        if self._embed_batcher_task is not None:
+            self._embed_batcher_task.cancel()
+            await asyncio.gather(self._embed_batcher_task, return_exceptions=True)
+            self._embed_batcher_task = None
+        
+        while self._embed_queue is not None and not self._embed_queue.empty():
+            _, future = self._embed_queue.get_nowait()
+            future.cancel()
+    
+    async def vector_search(self, query_data: Dict[str, Any],
+                            query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """Perform vector search for semantic similarity"""
         try:
             query_text = query_data["query"]
             k = query_data.get("k", self.max_candidates)
             filters = query_data.get("filters", {})
             
-            # Generate query embedding
-            query_embedding = await self.vector_search_tool.generate_embedding(query_text)
+            # Generate query embedding unless the caller already has one
+            if query_embedding is None:
+                query_embedding = await self._embed_cached(query_text)
+            
+            if self.vector_quantization:
+                try:
+                    return await self._quantized_search(query_embedding, k, filters)
+                except Exception as e:
+                    logger.warning("Quantized vector search failed, using exact search: %s", e)
             
-            # Search vector database
-            results = await self.vector_search_tool.search(
+            # Search vector database at full precision
+            return await self.vector_search_tool.search(
                 embedding=query_embedding,
                 k=k,
                 filters=filters
             )
             
-            return results
-            
         except Exception as e:
             logger.error(f"Failed to perform vector search: {str(e)}")
             return []
     
+    async def _quantized_search(self, query_embedding: Any, k: int,
+                                filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Coarse search over the quantized index, then exact rescoring of the candidates"""
+        # Over-fetch in the coarse pass to protect recall
+        k_coarse = max(k * self.coarse_k_factor, self.coarse_k_min)
+        coarse_results = await self.vector_search_tool.search(
+            embedding=query_embedding,
+            k=k_coarse,
+            filters=filters,
+            quantization=self.vector_quantization
+        )
+        
+        if not coarse_results:
+            return []
+        
+        # Exact full-precision rescoring of the coarse candidates
+        return await self.vector_search_tool.exact_rerank(
+            query_embedding,
+            [result["note_id"] for result in coarse_results],
+            k
+        )
+    
     async def graph_walk(self, query_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Perform graph traversal for relationship-based search"""
         try:
@@ -334,46 +795,315 @@ class PredictionAgent(Agent):
             max_hops = query_data.get("max_hops", self.graph_walk_max_hops)
             
             # Extract entities from query
-            entities = await self.prediction_layer_tool.extract_entities(query_text)
+            entities = await self._extract_query_entities(query_text)
             
             if not entities:
                 return []
             
-            # Find starting nodes
-            starting_nodes = []
-            for entity in entities:
-                nodes = await self.graph_db.find_notes_by_entity(entity["name"])
-                starting_nodes.extend(nodes)
+            # Find starting nodes (entity lookups run concurrently)
+            node_lists = await asyncio.gather(
+                *(self.graph_db.find_notes_by_entity(entity["name"]) for entity in entities),
+                return_exceptions=True
+            )
+            for entity, nodes in zip(entities, node_lists):
+                if isinstance(nodes, Exception):
+                    logger.warning(f"Failed to find notes for entity {entity['name']!r}: {str(nodes)}",
+                                   exc_info=nodes)
+            starting_nodes = list(itertools.chain.from_iterable(
+                nodes for nodes in node_lists if isinstance(nodes, list)
+            ))
             
             if not starting_nodes:
                 return []
             
-            # Perform graph traversal
-            traversal_results = []
-            for start_node in starting_nodes[:5]:  # Limit starting nodes
-                results = await self.graph_db.traverse_graph(
-                    start_node_id=start_node["note_id"],
+            # Walk starts inside the hot sub-graph in-process; only the
+            # remaining starts need Neo4j traversals, run concurrently
+            start_ids = [start_node["note_id"] for start_node in starting_nodes[:5]]  # Limit starting nodes
+            hot_results, cold_ids = await self._walk_hot_subgraph(query_text, start_ids, max_hops)
+            
+            # Merge results into a bounded top-k as each traversal finishes
+            best: Dict[str, Tuple] = {}
+            heap: List[Tuple] = []
+            sequence = itertools.count()
+            self._merge_walk_results(self._score_walk_results(hot_results, hot=True), best, heap, sequence)
+            
+            traversals = [
+                asyncio.ensure_future(self.graph_db.traverse_graph(
+                    start_node_id=start_id,
                     max_hops=max_hops,
                     relationship_types=["LINKS_TO", "MENTIONS", "SIMILAR_TO"]
-                )
-                traversal_results.extend(results)
+                ))
+                for start_id in cold_ids
+            ]
+            try:
+                for finished in asyncio.as_completed(traversals):
+                    try:
+                        results = await finished
+                    except Exception as e:
+                        logger.error(f"Graph traversal failed during graph walk: {str(e)}")
+                        continue
+                    self._merge_walk_results(self._score_walk_results(results), best, heap, sequence)
+                    
+                    # Stop waiting once the top-k is full of good enough results
+                    if (self.graph_walk_early_stop_score is not None
+                            and len(best) >= self.max_candidates
+                            and heap[0][0] >= self.graph_walk_early_stop_score):
+                        break
+            finally:
+                for traversal in traversals:
+                    traversal.cancel()
             
-            # Deduplicate and score
-            unique_results = {}
-            for result in traversal_results:
-                note_id = result["note_id"]
-                if note_id not in unique_results or result["score"] > unique_results[note_id]["score"]:
-                    unique_results[note_id] = result
+            # Highest score first; ties keep arrival order
+            return [entry[3] for entry in sorted(best.values(), reverse=True)]
             
-            # Sort by score
-            sorted_results = sorted(unique_results.values(), key=lambda x: x["score"], reverse=True)
+        except Exception as e:
+            logger.error(f"Failed to perform graph walk: {str(e)}")
+            return []
+    
+    def _score_walk_results(self, results: List[Dict[str, Any]], hot: bool = False) -> List[Dict[str, Any]]:
+        """Give walk results one record shape; hot sub-graph cosine scores are mapped
+        onto the Neo4j scale and decayed per hop. The native score is kept as raw_score"""
+        scored = []
+        for result in results:
+            hops = result.get("hops")
+            if hops is None:
+                path = result.get("path")
+                hops = len(path) - 1 if path else 0
+            score = result["score"]
+            if hot:
+                score = self.hot_walk_score_scale * max(score, 0.0) * self.graph_walk_hop_decay ** hops
+            scored.append({
+                "path": None,
+                "relationship": None,
+                **result,
+                "hops": hops,
+                "raw_score": result["score"],
+                "score": score
+            })
+        return scored
+    
+    def _merge_walk_results(self, results: List[Dict[str, Any]], best: Dict[str, Tuple],
+                            heap: List[Tuple], sequence: "itertools.count"):
+        """Fold traversal results into the best-per-note map and its bounded min-heap"""
+        for result in results:
+            note_id = result["note_id"]
+            score = result["score"]
+            current = best.get(note_id)
+            if current is not None and score <= current[0]:
+                continue
             
-            return sorted_results[:self.max_candidates]
+            # A superseded heap entry for this note is left in place and
+            # skipped when it reaches the top (lazy deletion)
+            entry = (score, -next(sequence), note_id, result)
+            best[note_id] = entry
+            heapq.heappush(heap, entry)
+            
+            while heap and (best.get(heap[0][2]) is not heap[0] or len(best) > self.max_candidates):
+                evicted = heapq.heappop(heap)
+                if best.get(evicted[2]) is evicted:
+                    del best[evicted[2]]
+    
+    async def _extract_query_entities(self, query_text: str) -> List[Dict[str, Any]]:
+        """Extract query entities, trying the regex before the model for short queries"""
+        if len(query_text) <= self.quick_entity_max_chars:
+            entities = self._quick_entities(query_text)
+            if entities:
+                return entities
+        
+        key = " ".join(query_text.lower().split())
+        entities = self._entity_cache.get(key)
+        if entities is None:
+            entities = await self.prediction_layer_tool.extract_entities(query_text)
+            self._entity_cache[key] = entities
+        return entities
+    
+    def _quick_entities(self, query_text: str) -> List[Dict[str, Any]]:
+        """Guess entities from quoted and capitalized terms"""
+        entities = []
+        seen = set()
+        for match in _QUICK_ENTITY_RE.finditer(query_text):
+            if match.group(1):
+                name = match.group(1).strip()
+            else:
+                words = match.group(2).split()
+                # Leading verbs and question words are capitalized only because they
+                # start the sentence ("Explain", "Show"); the rest of the run is kept
+                while words and words[0].lower() in _QUICK_ENTITY_STOPWORDS:
+                    words.pop(0)
+                name = " ".join(words)
+            
+            if name and name not in seen:
+                seen.add(name)
+                entities.append({"name": name})
+        
+        return entities
+    
+    async def sparse_search(self, query_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Perform BM25 keyword search for exact term matches"""
+        try:
+            if self.bm25 is None:
+                return []
+            
+            query_text = query_data["query"]
+            k = query_data.get("k", self.max_candidates)
+            
+            # Scoring is CPU-bound, keep it off the event loop
+            return await asyncio.to_thread(self._bm25_retrieve, query_text, k)
             
         except Exception as e:
-            logger.error(f"Failed to perform graph walk: {str(e)}")
+            logger.error(f"Failed to perform sparse search: {str(e)}")
             return []
     
+    def _bm25_retrieve(self, query_text: str, k: int) -> List[Dict[str, Any]]:
+        """Score the query against the BM25 index and keep notes with any term match"""
+        query_tokens = bm25s.tokenize(query_text, show_progress=False)
+        k = min(k, self.bm25.scores["num_docs"])
+        documents, scores = self.bm25.retrieve(
+            query_tokens, k=k, show_progress=False, n_threads=1,
+            backend_selection=self._bm25_backend
+        )
+        return [
+            {"note_id": document["id"], "bm25_score": float(score)}
+            for document, score in zip(documents[0], scores[0])
+            if score > 0
+        ]
+    
+    async def hybrid_retrieve(self, query_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Run vector, keyword and graph retrieval concurrently, then fuse their rankings"""
+        return (await self.hybrid_retrieve_legs(query_data))["fused"]
+    
+    async def hybrid_retrieve_legs(self, query_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Like hybrid_retrieve, but also return each leg's own results (vector, graph, sparse)"""
+        try:
+            query_text = query_data["query"]
+            k = query_data.get("k", self.max_candidates)
+            
+            # All retrievals are independent, so overlap them. The dense leg embeds
+            # the query and keeps the embedding for scoring below; each leg may be
+            # capped by its own timeout (vector_timeout, graph_timeout, sparse_timeout)
+            # and a failing leg cancels its siblings
+            query_embedding = None
+            
+            async def dense_leg() -> List[Dict[str, Any]]:
+                nonlocal query_embedding
+                try:
+                    query_embedding = await self._embed_cached(query_text)
+                except Exception as e:
+                    logger.error(f"Failed to embed query during hybrid retrieval: {str(e)}")
+                return await self.vector_search({
+                    "query": query_text,
+                    "k": max(k // 2, 1),
+                    "filters": query_data.get("filters", {})
+                }, query_embedding=query_embedding)
+            
+            legs = (
+                self._with_timeout("Vector search", dense_leg(), query_data.get("vector_timeout")),
+                self._with_timeout("Graph walk", self.graph_walk({
+                    "query": query_text,
+                    "max_hops": query_data.get("max_hops", self.graph_walk_max_hops)
+                }), query_data.get("graph_timeout")),
+                self._with_timeout("Sparse search", self.sparse_search({
+                    "query": query_text,
+                    "k": k
+                }), query_data.get("sparse_timeout"))
+            )
+            if hasattr(asyncio, "TaskGroup"):
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [tg.create_task(leg) for leg in legs]
+                vector_results, graph_results, sparse_results = (task.result() for task in tasks)
+            else:
+                vector_results, graph_results, sparse_results = await asyncio.gather(*legs)
+            
+            # Merge by note, carrying the graph traversal score as graph_score
+            merged = {}
+            for candidate in vector_results:
+                merged[candidate["note_id"]] = dict(candidate)
+            for candidate in graph_results:
+                entry = merged.setdefault(candidate["note_id"], dict(candidate))
+                entry["graph_score"] = max(entry.get("graph_score", 0.0), candidate["score"])
+            for candidate in sparse_results:
+                entry = merged.setdefault(candidate["note_id"], dict(candidate))
+                entry["bm25_score"] = candidate["bm25_score"]
+            
+            # Give the other candidates a similarity signal from the same embedding
+            if query_embedding is not None:
+                await self._attach_similarity(
+                    [c for c in merged.values() if "similarity_score" not in c], query_embedding
+                )
+            
+            dense_ranking = sorted(
+                (c for c in merged.values() if "similarity_score" in c),
+                key=lambda x: x["similarity_score"], reverse=True
+            )
+            fused = self._rrf_fuse(merged, {
+                "dense": [c["note_id"] for c in dense_ranking],
+                "sparse": [c["note_id"] for c in sparse_results],
+                "graph": [c["note_id"] for c in graph_results]
+            })
+            return {
+                "vector": vector_results,
+                "graph": graph_results,
+                "sparse": sparse_results,
+                "fused": fused
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to perform hybrid retrieval: {str(e)}")
+            return {"vector": [], "graph": [], "sparse": [], "fused": []}
+    
+    @staticmethod
+    async def _with_timeout(name: str, coro, timeout: Optional[float]) -> List[Dict[str, Any]]:
+        """Await a retrieval leg, returning no results if it exceeds its timeout"""
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s timed out after %ss", name, timeout)
+            return []
+    
+    def _rrf_fuse(self, candidates: Dict[str, Dict[str, Any]],
+                  rankings: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """Fuse per-source rankings with (optionally weighted) reciprocal rank fusion"""
+        for candidate in candidates.values():
+            candidate["rrf_score"] = 0.0
+        
+        for source, note_ids in rankings.items():
+            weight = self.rrf_weights.get(source, 1.0)
+            for rank, note_id in enumerate(note_ids, 1):
+                candidates[note_id]["rrf_score"] += weight / (self.rrf_k + rank)
+        
+        return heapq.nlargest(self.rerank_top_k, candidates.values(), key=lambda x: x["rrf_score"])
+    
+    async def _attach_similarity(self, candidates: List[Dict[str, Any]],
+                                 query_embedding: np.ndarray) -> None:
+        """Score candidates by cosine similarity of their stored content embedding to the query"""
+        try:
+            if not candidates:
+                return
+            
+            artifacts = await self.graph_db.get_note_artifacts([c["note_id"] for c in candidates])
+            
+            scored = []
+            vectors = []
+            for candidate in candidates:
+                vector = artifacts.get(candidate["note_id"], {}).get("embeddings", {}).get("content")
+                if vector is not None:
+                    scored.append(candidate)
+                    vectors.append(vector)
+            
+            if not scored:
+                return
+            
+            matrix = np.asarray(vectors, dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            similarities = (matrix @ query) / np.maximum(norms, 1e-12)
+            
+            for candidate, similarity in zip(scored, similarities.tolist()):
+                candidate["similarity_score"] = similarity
+            
+        except Exception as e:
+            logger.error(f"Failed to attach similarity scores: {str(e)}")
+    
     async def rerank_candidates(self, candidates: List[Dict[str, Any]], 
                               query_text: str, strategy: str) -> List[Dict[str, Any]]:
         """Rerank candidates using multiple signals"""
@@ -383,13 +1113,13 @@ class PredictionAgent(Agent):
             
             # Apply reranking based on strategy
             if strategy == "hybrid":
-                reranked = await self._hybrid_rerank(candidates, query_text)
+                reranked = self._hybrid_rerank(candidates, query_text)
             elif strategy == "temporal":
-                reranked = await self._temporal_rerank(candidates, query_text)
+                reranked = self._temporal_rerank(candidates, query_text)
             elif strategy == "hierarchical":
-                reranked = await self._hierarchical_rerank(candidates, query_text)
+                reranked = self._hierarchical_rerank(candidates, query_text)
             else:
-                reranked = await self._default_rerank(candidates, query_text)
+                reranked = self._default_rerank(candidates, query_text)
             
             return reranked[:self.rerank_top_k]
             
@@ -397,104 +1127,258 @@ class PredictionAgent(Agent):
             logger.error(f"Failed to rerank candidates: {str(e)}")
             return candidates[:self.rerank_top_k]
     
-    async def _hybrid_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
+    def _hybrid_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
         """Rerank using hybrid scoring (vector + graph + recency)"""
         try:
-            for candidate in candidates:
-                # Combine multiple signals
-                vector_score = candidate.get("similarity_score", 0.0)
-                graph_score = candidate.get("graph_score", 0.0)
-                recency_score = candidate.get("recency_score", 0.0)
-                hub_score = candidate.get("hub_score", 0.0)
-                
-                # Weighted combination
-                hybrid_score = (
-                    0.4 * vector_score +
-                    0.3 * graph_score +
-                    0.2 * recency_score +
-                    0.1 * hub_score
-                )
-                
-                candidate["hybrid_score"] = hybrid_score
+            # Gather each signal into its own float32 array
+            count = len(candidates)
+            signals = [
+                np.fromiter((c.get(key, 0.0) for c in candidates), dtype=np.float32, count=count)
+                for key in ("similarity_score", "graph_score", "recency_score", "hub_score")
+            ]
             
-            # Sort by hybrid score
-            return sorted(candidates, key=lambda x: x["hybrid_score"], reverse=True)
+            # Weighted combination, JIT-compiled for large candidate pools
+            score = _hybrid_scores
+            if _NUMBA_AVAILABLE and count >= self.numba_min_candidates:
+                score = _hybrid_scores_jit
+            scores = score(*signals)
+            
+            return self._select_top_k(candidates, scores, "hybrid_score")
             
         except Exception as e:
             logger.error(f"Failed to hybrid rerank: {str(e)}")
             return candidates
     
-    async def _temporal_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
+    def _temporal_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
         """Rerank using temporal signals"""
         try:
-            for candidate in candidates:
+            now = datetime.now(timezone.utc)
+            inv365 = 1.0 / 365.0
+            scores = np.empty(len(candidates), dtype=np.float64)
+            
+            for i, candidate in enumerate(candidates):
                 # Extract temporal information
                 created_at = candidate.get("created_at")
                 updated_at = candidate.get("updated_at")
                 
+                if isinstance(updated_at, str):
+                    try:
+                        updated_at = ciso8601.parse_datetime(updated_at)
+                    except ValueError:
+                        updated_at = None
+                if updated_at is not None and updated_at.tzinfo is None:
+                    updated_at = updated_at.replace(tzinfo=timezone.utc)
+                
                 # Calculate temporal score
                 if created_at and updated_at:
-                    # Prefer recently updated notes
-                    from datetime import datetime, timezone
-                    now = datetime.now(timezone.utc)
-                    if isinstance(updated_at, str):
-                        updated_at = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
-                    
-                    days_since_update = (now - updated_at).days
-                    temporal_score = max(0, 1.0 - (days_since_update / 365))  # Decay over a year
+                    # Prefer recently updated notes, decaying over a year
+                    temporal_score = max(0.0, 1.0 - (now - updated_at).days * inv365)
                 else:
                     temporal_score = 0.5
                 
-                candidate["temporal_score"] = temporal_score
+                scores[i] = temporal_score
             
-            # Sort by temporal score
-            return sorted(candidates, key=lambda x: x["temporal_score"], reverse=True)
+            return self._select_top_k(candidates, scores, "temporal_score")
             
         except Exception as e:
             logger.error(f"Failed to temporal rerank: {str(e)}")
             return candidates
     
-    async def _hierarchical_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
+    def _hierarchical_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
         """Rerank using hierarchical structure"""
         try:
-            for candidate in candidates:
-                # Consider section hierarchy
-                section_level = candidate.get("section_level", 0)
-                heading_relevance = candidate.get("heading_relevance", 0.0)
-                
-                # Higher level sections get higher scores
-                hierarchy_score = (5 - section_level) / 5.0 if section_level <= 5 else 0.0
-                
-                # Combine with heading relevance
-                hierarchical_score = 0.7 * hierarchy_score + 0.3 * heading_relevance
-                
-                candidate["hierarchical_score"] = hierarchical_score
+            # Consider section hierarchy
+            count = len(candidates)
+            section_levels = np.fromiter(
+                (c.get("section_level", 0) for c in candidates), dtype=np.float64, count=count
+            )
+            heading_relevance = np.fromiter(
+                (c.get("heading_relevance", 0.0) for c in candidates), dtype=np.float64, count=count
+            )
+            
+            # Higher level sections get higher scores
+            hierarchy_scores = np.where(section_levels <= 5, (5 - section_levels) / 5.0, 0.0)
+            
+            # Combine with heading relevance
+            scores = 0.7 * hierarchy_scores + 0.3 * heading_relevance
             
-            # Sort by hierarchical score
-            return sorted(candidates, key=lambda x: x["hierarchical_score"], reverse=True)
+            return self._select_top_k(candidates, scores, "hierarchical_score")
             
         except Exception as e:
             logger.error(f"Failed to hierarchical rerank: {str(e)}")
             return candidates
     
-    async def _default_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
+    def _select_top_k(self, candidates: List[Dict[str, Any]], scores: np.ndarray,
+                      score_key: str) -> List[Dict[str, Any]]:
+        """Return the top-k candidates by score, attaching the score only to those"""
+        # A stable argsort keeps ties in input order, which a partition would not
+        order = np.argsort(-scores, kind="stable")[:max(self.rerank_top_k, 0)]
+        
+        selected = []
+        for i in order.tolist():
+            candidate = candidates[i]
+            candidate[score_key] = float(scores[i])
+            selected.append(candidate)
+        return selected
+    
+    def _default_rerank(self, candidates: List[Dict[str, Any]], query_text: str) -> List[Dict[str, Any]]:
         """Default reranking using similarity scores"""
         try:
-            # Sort by similarity score
-            return sorted(candidates, key=lambda x: x.get("similarity_score", 0.0), reverse=True)
+            # Select the top-k by similarity score
+            return heapq.nlargest(self.rerank_top_k, candidates,
+                                  key=lambda x: x.get("similarity_score", 0.0))
             
         except Exception as e:
             logger.error(f"Failed to default rerank: {str(e)}")
             return candidates
     
+    async def _walk_hot_subgraph(self, query_text: str, start_ids: List[str],
+                                 max_hops: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Walk from starts inside the hot sub-graph; returns results and missed starts"""
+        graph = self._hot_graph
+        if graph is None:
+            return [], start_ids
+        
+        index_of = graph["index_of"]
+        entry_points = [index_of[start_id] for start_id in start_ids if start_id in index_of]
+        if not entry_points:
+            return [], start_ids
+        
+        try:
+            query = await self._embed_cached(query_text)
+            norm = np.linalg.norm(query)
+            query = np.ascontiguousarray(query / norm if norm > 0 else query, dtype=np.float32)
+            
+            entry_points = np.asarray(entry_points, dtype=np.int64)
+            if max_hops <= self.hot_bfs_max_hops:
+                # Shallow walks enumerate the whole neighborhood and score it exactly,
+                # keeping the ef best by the same hop-decayed score used for merging
+                node_indices, depth, parent, via = self._bfs_hot_subgraph(entry_points, max_hops)
+                scores = graph["embeddings"][node_indices] @ query
+                if scores.shape[0] > self.hot_search_ef:
+                    walk_scores = np.maximum(scores, 0.0) * self.graph_walk_hop_decay ** depth[node_indices]
+                    top = np.argpartition(-walk_scores, self.hot_search_ef - 1)[:self.hot_search_ef]
+                    node_indices, scores = node_indices[top], scores[top]
+            else:
+                # Deeper walks use greedy best-first search
+                node_indices, scores, depth, parent, via = _best_first_search(
+                    graph["indptr"], graph["indices"], graph["embeddings"], query,
+                    entry_points, self.hot_search_ef, max_hops
+                )
+        except Exception as e:
+            logger.error(f"Failed to walk hot sub-graph: {str(e)}")
+            return [], start_ids
+        
+        # Same record shape as Neo4j traversals: hop count, path from the start
+        # node and the relationship of the final edge
+        node_ids = graph["node_ids"]
+        relationships = graph["relationships"]
+        edge_codes = graph["edge_codes"]
+        results = []
+        for i, score in zip(node_indices.tolist(), scores.tolist()):
+            path = [i]
+            while parent[path[-1]] >= 0:
+                path.append(int(parent[path[-1]]))
+            results.append({
+                "note_id": node_ids[i],
+                "score": score,
+                "hops": int(depth[i]),
+                "path": [node_ids[node] for node in reversed(path)],
+                "relationship": relationships[edge_codes[via[i]]] if via[i] >= 0 else None
+            })
+        return results, [start_id for start_id in start_ids if start_id not in index_of]
+    
+    def _bfs_hot_subgraph(self, entry_points: np.ndarray,
+                          max_hops: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Node indices reachable within max_hops of the entry points in BFS order,
+        with per-node depth, parent and arrival edge slot"""
+        graph = self._hot_graph
+        return _direction_optimized_bfs(
+            graph["indptr"], graph["indices"], entry_points, max_hops, self.bfs_alpha
+        )
+    
+    async def refresh_hot_subgraph(self) -> Dict[str, Any]:
+        """Materialize the hottest sub-graph as CSR adjacency for in-process traversal"""
+        if not _NUMBA_AVAILABLE or not self.hot_subgraph_size:
+            return {"status": "disabled"}
+        
+        if not (hasattr(self.graph_db, "get_graph_version")
+                and hasattr(self.graph_db, "export_hot_subgraph")):
+            logger.info("Skipping hot sub-graph refresh: graph backend does not support export")
+            return {"status": "unsupported"}
+        
+        # The snapshot is only rebuilt when the graph has changed since the last build
+        version = await self.graph_db.get_graph_version()
+        if self._hot_graph is not None and self._hot_graph["version"] == version:
+            return {"status": "unchanged", "version": version}
+        
+        subgraph = await self.graph_db.export_hot_subgraph(limit=self.hot_subgraph_size)
+        node_ids = [node["note_id"] for node in subgraph["nodes"]]
+        if not node_ids:
+            self._hot_graph = None
+            return {"status": "completed", "nodes": 0, "edges": 0}
+        
+        index_of = {note_id: i for i, note_id in enumerate(node_ids)}
+        
+        # Unit-normalized content embeddings so inner product is cosine similarity;
+        # nodes without an embedding keep a zero row and are only traversed through
+        artifacts = await self.graph_db.get_note_artifacts(node_ids)
+        vectors = [
+            artifacts.get(note_id, {}).get("embeddings", {}).get("content")
+            for note_id in node_ids
+        ]
+        dim = next((len(vector) for vector in vectors if vector is not None), 0)
+        embeddings = np.zeros((len(node_ids), dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector is not None:
+                embeddings[i] = vector
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        
+        # Relationship types are kept as small codes alongside the adjacency
+        code_of: Dict[str, int] = {}
+        edges = [
+            (index_of[edge["source_id"]], index_of[edge["target_id"]],
+             code_of.setdefault(edge.get("relationship", "LINKS_TO"), len(code_of)))
+            for edge in subgraph["edges"]
+            if edge["source_id"] in index_of and edge["target_id"] in index_of
+        ]
+        endpoints = np.asarray(edges, dtype=np.int64).reshape(-1, 3)
+        indptr, indices, edge_codes = _build_csr(
+            len(node_ids), endpoints[:, 0], endpoints[:, 1], endpoints[:, 2]
+        )
+        
+        self._hot_graph = {
+            "version": version,
+            "node_ids": node_ids,
+            "index_of": index_of,
+            "indptr": indptr,
+            "indices": indices,
+            "edge_codes": edge_codes,
+            "relationships": list(code_of),
+            "embeddings": embeddings
+        }
+        return {"status": "completed", "version": version, "nodes": len(node_ids), "edges": len(edges)}
+    
     async def update_models(self) -> Dict[str, Any]:
         """Update prediction models (maintenance task)"""
         try:
-            # This would typically involve retraining models
-            # For now, just return a success status
+            # This would typically involve retraining models; for now only the
+            # in-process hot sub-graph snapshot is rebuilt, and only when enabled
+            if self.hot_subgraph_refresh:
+                try:
+                    hot_subgraph = await self.refresh_hot_subgraph()
+                except Exception as e:
+                    logger.warning(f"Failed to refresh hot sub-graph: {str(e)}")
+                    hot_subgraph = {"status": "error", "error": str(e)}
+            else:
+                logger.info("Skipping hot sub-graph refresh: hot_subgraph_refresh is disabled")
+                hot_subgraph = {"status": "skipped"}
+            
             return {
                 "status": "completed",
                 "message": "Models updated successfully",
+                "hot_subgraph": hot_subgraph,
                 "timestamp": datetime.now().isoformat()
             }
             
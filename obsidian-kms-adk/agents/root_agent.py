@@ -4,9 +4,12 @@ Coordinates specialized agents and manages task routing
 """
 
 import asyncio
+import functools
 import logging
-from typing import Dict, List, Any, Optional, Union
-from datetime import datetime
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Any, Optional, Union, AsyncIterator, Tuple, Deque
 from enum import Enum
 
 from google.adk import Agent, Tool, Memory
@@ -20,6 +23,12 @@ from .synthesis_agent import SynthesisAgent
 
 logger = logging.getLogger(__name__)
 
+# uvloop is optional and not available on Windows
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 class TaskType(Enum):
     """Types of tasks the orchestrator can handle"""
@@ -40,6 +49,10 @@ class OrchestrationPattern(Enum):
     HYBRID = "hybrid"
 
 
+# Task types that write notes and run the ingest -> link -> graph pipeline
+_WRITE_TASKS = frozenset({TaskType.ADD_NOTE, TaskType.UPDATE_NOTE})
+
+
 class RootOrchestrator(Agent):
     """
     Root Orchestrator coordinates specialized agents and manages task routing.
@@ -51,6 +64,15 @@ class RootOrchestrator(Agent):
     - Consolidate results from multiple agents
     """
     
+    # Orchestration pattern per task type; anything else runs sequentially
+    _PATTERN_MAP = {
+        TaskType.ADD_NOTE: OrchestrationPattern.SEQUENTIAL,  # ingest -> link -> update graph
+        TaskType.UPDATE_NOTE: OrchestrationPattern.SEQUENTIAL,
+        TaskType.QUERY: OrchestrationPattern.HYBRID,  # parallel search + graph walk, then synthesis
+        TaskType.SYNTHESIS: OrchestrationPattern.LOOP,  # iterative refinement with human feedback
+        TaskType.MAINTENANCE: OrchestrationPattern.PARALLEL  # maintenance tasks run concurrently
+    }
+    
     def __init__(self, config: AgentConfig):
         super().__init__(config)
         
@@ -60,17 +82,57 @@ class RootOrchestrator(Agent):
         self.prediction_agent = PredictionAgent(config)
         self.synthesis_agent = SynthesisAgent(config)
         
-        # Session management
-        self.active_sessions: Dict[str, Dict[str, Any]] = {}
-        self.task_queue: List[Dict[str, Any]] = []
+        # Executor per orchestration pattern
+        self._route_map = {
+            OrchestrationPattern.SEQUENTIAL: self._sequential_execution,
+            OrchestrationPattern.PARALLEL: self._parallel_execution_collect,
+            OrchestrationPattern.LOOP: self._loop_execution,
+            OrchestrationPattern.HYBRID: self._hybrid_execution
+        }
+        
+        # Session management (LRU-bounded sessions, bounded task queue)
+        self._max_sessions = config.get("max_sessions", 1024)
+        self._max_queue = config.get("max_queue", 1000)
+        self.active_sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.task_queue: Deque[Dict[str, Any]] = deque(maxlen=self._max_queue)
+        
+        # Per-leg timeouts (seconds) for query fan-out
+        self.vector_timeout = config.get("vector_timeout", 2.0)
+        self.graph_timeout = config.get("graph_timeout", 2.0)
+        self.sparse_timeout = config.get("sparse_timeout", 2.0)
         
         # Performance tracking
-        self.metrics = {
-            "tasks_completed": 0,
-            "tasks_failed": 0,
-            "avg_response_time": 0.0,
-            "agent_utilization": {}
-        }
+        self._completed = 0
+        self._failed = 0
+        self._sum_time = 0.0
+        self._agent_utilization: Dict[str, Any] = {}
+    
+    @classmethod
+    def run(cls, coro):
+        """Run a coroutine to completion, on a uvloop event loop when available"""
+        loop_factory = uvloop.new_event_loop if uvloop is not None else None
+        if sys.version_info >= (3, 11):
+            with asyncio.Runner(loop_factory=loop_factory) as runner:
+                return runner.run(coro)
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return asyncio.run(coro)
+    
+    async def startup(self):
+        """Warm up sub-agents before serving the first task"""
+        # The prediction agent serves queries under per-leg timeouts, so a cold
+        # model load there would time out the first query
+        await asyncio.gather(
+            self.ingestion_agent.startup(),
+            self.prediction_agent.startup()
+        )
+    
+    async def shutdown(self):
+        """Release sub-agent resources"""
+        await asyncio.gather(
+            self.ingestion_agent.aclose(),
+            self.prediction_agent.aclose()
+        )
     
     async def process_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -82,116 +144,134 @@ class RootOrchestrator(Agent):
         Returns:
             Task result with status, data, and metadata
         """
-        start_time = datetime.now()
-        task_id = task.get("id", f"task_{datetime.now().timestamp()}")
+        start_time = time.perf_counter()
+        task_id = task["id"] if "id" in task else f"task_{time.time_ns()}"
         
         try:
-            logger.info(f"Processing task {task_id}: {task.get('type')}")
+            logger.info("Processing task %s: %s", task_id, task.get("type"))
             
             # Determine orchestration pattern
-            pattern = self._determine_pattern(task)
+            task_type, pattern = self._determine_pattern(task.get("type"))
             
             # Route to appropriate agents
-            result = await self._route_task(task, pattern)
+            result = await self._route_task(task_type, task.get("payload", {}), pattern)
             
             # Update metrics
-            self._update_metrics(task_id, start_time, success=True)
+            elapsed = time.perf_counter() - start_time
+            self._update_metrics(task_id, elapsed, success=True)
             
             return {
                 "task_id": task_id,
                 "status": "success",
                 "result": result,
                 "pattern_used": pattern.value,
-                "processing_time": (datetime.now() - start_time).total_seconds()
+                "processing_time": elapsed
             }
             
         except Exception as e:
-            logger.error(f"Task {task_id} failed: {str(e)}")
-            self._update_metrics(task_id, start_time, success=False)
+            logger.error("Task %s failed", task_id, exc_info=True)
+            elapsed = time.perf_counter() - start_time
+            self._update_metrics(task_id, elapsed, success=False)
             
             return {
                 "task_id": task_id,
                 "status": "error",
                 "error": str(e),
-                "processing_time": (datetime.now() - start_time).total_seconds()
+                "processing_time": elapsed
             }
     
-    def _determine_pattern(self, task: Dict[str, Any]) -> OrchestrationPattern:
+    @staticmethod
+    def _coerce_task_type(value: Any) -> Optional[TaskType]:
+        """Convert a task type string or member to TaskType, ignoring unknown values"""
+        try:
+            return TaskType(value)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _pattern_for(task_type_str: Any) -> Tuple[Optional[TaskType], OrchestrationPattern]:
+        """Resolve a raw task type to its TaskType and orchestration pattern (memoized)"""
+        task_type = RootOrchestrator._coerce_task_type(task_type_str)
+        return task_type, RootOrchestrator._PATTERN_MAP.get(task_type, OrchestrationPattern.SEQUENTIAL)
+    
+    def _determine_pattern(self, raw_type: Any) -> Tuple[Optional[TaskType], OrchestrationPattern]:
         """Determine the best orchestration pattern for the task"""
-        task_type = task.get("type")
-        
-        if task_type in [TaskType.ADD_NOTE, TaskType.UPDATE_NOTE]:
-            # Sequential: ingest -> link -> update graph
-            return OrchestrationPattern.SEQUENTIAL
-        elif task_type == TaskType.QUERY:
-            # Hybrid: parallel search + graph walk, then synthesis
-            return OrchestrationPattern.HYBRID
-        elif task_type == TaskType.SYNTHESIS:
-            # Loop: iterative refinement with human feedback
-            return OrchestrationPattern.LOOP
-        elif task_type == TaskType.MAINTENANCE:
-            # Parallel: multiple maintenance tasks can run concurrently
-            return OrchestrationPattern.PARALLEL
-        else:
-            return OrchestrationPattern.SEQUENTIAL
+        try:
+            return self._pattern_for(raw_type)
+        except TypeError:
+            # Unhashable type values can't be cached and never match a TaskType
+            return None, OrchestrationPattern.SEQUENTIAL
     
-    async def _route_task(self, task: Dict[str, Any], pattern: OrchestrationPattern) -> Dict[str, Any]:
+    async def _route_task(self, task_type: Optional[TaskType], payload: Dict[str, Any],
+                          pattern: OrchestrationPattern) -> Dict[str, Any]:
         """Route task to appropriate agents based on pattern"""
-        task_type = task.get("type")
-        payload = task.get("payload", {})
-        
-        if pattern == OrchestrationPattern.SEQUENTIAL:
-            return await self._sequential_execution(task_type, payload)
-        elif pattern == OrchestrationPattern.PARALLEL:
-            return await self._parallel_execution(task_type, payload)
-        elif pattern == OrchestrationPattern.LOOP:
-            return await self._loop_execution(task_type, payload)
-        elif pattern == OrchestrationPattern.HYBRID:
-            return await self._hybrid_execution(task_type, payload)
-        else:
-            raise ValueError(f"Unknown orchestration pattern: {pattern}")
+        return await self._route_map[pattern](task_type, payload)
     
     async def _sequential_execution(self, task_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Execute tasks sequentially"""
-        results = []
+        if task_type not in _WRITE_TASKS:
+            return {"execution_type": "sequential"}
         
-        if task_type in [TaskType.ADD_NOTE, TaskType.UPDATE_NOTE]:
-            # 1. Ingestion
-            ingestion_result = await self.ingestion_agent.process_note(payload)
-            results.append(("ingestion", ingestion_result))
-            
-            # 2. Linking
-            linking_result = await self.linking_agent.process_links(ingestion_result)
-            results.append(("linking", linking_result))
-            
-            # 3. Update graph
-            graph_result = await self.linking_agent.update_graph(linking_result)
-            results.append(("graph_update", graph_result))
-            
-        return {"execution_type": "sequential", "results": results}
+        # Ingestion -> linking -> graph update, each step feeding the next
+        ingestion = await self.ingestion_agent.process_note(payload)
+        linking = await self.linking_agent.process_links(ingestion)
+        graph = await self.linking_agent.update_graph(linking)
+        
+        return {
+            "execution_type": "sequential",
+            "ingestion": ingestion,
+            "linking": linking,
+            "graph_update": graph
+        }
     
-    async def _parallel_execution(self, task_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute tasks in parallel"""
-        tasks = []
+    async def _parallel_execution(self, task_type: str,
+                                  payload: Dict[str, Any]) -> AsyncIterator[Tuple[int, str, Any]]:
+        """Execute tasks in parallel, yielding (index, name, result) as each one finishes"""
+        names: List[str] = []
+        coros = []
         
         if task_type == TaskType.MAINTENANCE:
             # Run multiple maintenance tasks concurrently
-            tasks = [
+            names = ["reindex_notes", "refresh_links", "update_models"]
+            coros = [
                 self.ingestion_agent.reindex_notes(),
                 self.linking_agent.refresh_links(),
                 self.prediction_agent.update_models(),
             ]
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        tasks = [
+            asyncio.create_task(self._indexed(index, coro), name=names[index])
+            for index, coro in enumerate(coros)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, result = await finished
+                yield index, names[index], result
+        finally:
+            # Stop anything still running if the consumer stops early
+            for task in tasks:
+                task.cancel()
+    
+    async def _parallel_execution_collect(self, task_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute tasks in parallel and collect their results in task order"""
+        collected = {}
+        async for index, name, result in self._parallel_execution(task_type, payload):
+            collected[index] = {"task": name, "result": result}
         
         return {
             "execution_type": "parallel",
-            "results": [
-                {"task": f"maintenance_{i}", "result": result}
-                for i, result in enumerate(results)
-            ]
+            "results": [collected[index] for index in sorted(collected)]
         }
     
+    @staticmethod
+    async def _indexed(index: int, coro) -> Tuple[int, Any]:
+        """Await a coroutine, returning its index with the result or the exception it raised"""
+        try:
+            return index, await coro
+        except Exception as e:
+            return index, e
+    
     async def _loop_execution(self, task_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Execute tasks with iterative refinement"""
         max_iterations = payload.get("max_iterations", 3)
@@ -226,51 +306,66 @@ class RootOrchestrator(Agent):
     async def _hybrid_execution(self, task_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Execute tasks with hybrid approach (parallel + sequential)"""
         if task_type == TaskType.QUERY:
-            # Parallel: vector search + graph walk
-            vector_task = self.prediction_agent.vector_search(payload)
-            graph_task = self.prediction_agent.graph_walk(payload)
-            
-            vector_result, graph_result = await asyncio.gather(vector_task, graph_task)
+            # Parallel: vector, keyword and graph retrieval fused by the prediction
+            # agent, each leg capped by its own timeout
+            legs = await self.prediction_agent.hybrid_retrieve_legs({
+                **payload,
+                "vector_timeout": payload.get("vector_timeout", self.vector_timeout),
+                "graph_timeout": payload.get("graph_timeout", self.graph_timeout),
+                "sparse_timeout": payload.get("sparse_timeout", self.sparse_timeout)
+            })
             
-            # Sequential: synthesis
+            # Sequential: synthesis keeps its vector/graph inputs; the fused
+            # ranking is passed alongside them
             synthesis_result = await self.synthesis_agent.compose_answer(
                 payload, 
-                {"vector": vector_result, "graph": graph_result}
+                {"vector": legs["vector"], "graph": legs["graph"], "fused": legs["fused"]}
             )
             
             return {
                 "execution_type": "hybrid",
-                "vector_search": vector_result,
-                "graph_walk": graph_result,
+                "vector_search": legs["vector"],
+                "graph_walk": legs["graph"],
+                "results": legs["fused"],
                 "synthesis": synthesis_result
             }
         
         return {"execution_type": "hybrid", "results": []}
     
-    def _update_metrics(self, task_id: str, start_time: datetime, success: bool):
+    def _update_metrics(self, task_id: str, elapsed_s: float, success: bool):
         """Update performance metrics"""
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
+        self._sum_time += elapsed_s
         if success:
-            self.metrics["tasks_completed"] += 1
+            self._completed += 1
         else:
-            self.metrics["tasks_failed"] += 1
-        
-        # Update average response time
-        total_tasks = self.metrics["tasks_completed"] + self.metrics["tasks_failed"]
-        current_avg = self.metrics["avg_response_time"]
-        self.metrics["avg_response_time"] = (
-            (current_avg * (total_tasks - 1) + processing_time) / total_tasks
-        )
+            self._failed += 1
     
     async def get_session_context(self, session_id: str) -> Dict[str, Any]:
         """Get context for a specific session"""
-        return self.active_sessions.get(session_id, {})
+        context = self.active_sessions.get(session_id)
+        if context is None:
+            return {}
+        self.active_sessions.move_to_end(session_id)
+        return context
     
     async def update_session_context(self, session_id: str, context: Dict[str, Any]):
         """Update session context"""
         self.active_sessions[session_id] = context
+        self.active_sessions.move_to_end(session_id)
+        while len(self.active_sessions) > self._max_sessions:
+            self.active_sessions.popitem(last=False)
+    
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of performance metrics, with the average computed on demand"""
+        total_tasks = self._completed + self._failed
+        return {
+            "tasks_completed": self._completed,
+            "tasks_failed": self._failed,
+            "avg_response_time": self._sum_time / total_tasks if total_tasks else 0.0,
+            "agent_utilization": dict(self._agent_utilization)
+        }
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get current performance metrics"""
-        return self.metrics.copy()
+        return self.metrics
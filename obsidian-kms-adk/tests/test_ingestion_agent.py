@@ -0,0 +1,105 @@
+"""
+Tests for IngestionAgent reindex write-ahead log and resume
+"""
+
+import asyncio
+import hashlib
+import os
+
+import orjson
+import pytest
+
+from agents.ingestion_agent import IngestionAgent
+
+
+def _checksum(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = IngestionAgent({"wal_path": str(tmp_path / "reindex.wal")})
+    agent.processed = []
+
+    async def process_note(note_data):
+        agent.processed.append(note_data["path"])
+        if note_data["content"] == "broken":
+            return {"status": "error", "error": "boom"}
+        return {"status": "success"}
+
+    agent.process_note = process_note
+    return agent
+
+
+def _serve(agent, notes):
+    async def iter_all_notes():
+        for note in notes:
+            yield note
+
+    agent.graph_db.iter_all_notes = iter_all_notes
+
+
+def _write_wal(agent, lines):
+    with open(agent.wal_path, "wb") as wal:
+        for line in lines:
+            wal.write(line + b"\n")
+
+
+class TestLoadWal:
+    def test_missing_wal_is_empty(self, agent):
+        assert agent._load_wal() == set()
+
+    def test_only_current_index_version_counts(self, agent):
+        _write_wal(agent, [
+            orjson.dumps({"path": "a.md", "ck": "1", "v": agent.index_version}),
+            orjson.dumps({"path": "b.md", "ck": "2", "v": "old-model"}),
+        ])
+
+        assert agent._load_wal() == {("a.md", "1")}
+
+    def test_torn_final_line_is_ignored(self, agent):
+        _write_wal(agent, [
+            orjson.dumps({"path": "a.md", "ck": "1", "v": agent.index_version}),
+            b'{"path": "b.md", "ck',
+        ])
+
+        assert agent._load_wal() == {("a.md", "1")}
+
+
+class TestReindexResume:
+    def test_resume_skips_notes_already_in_wal(self, agent):
+        _serve(agent, [{"path": "a.md", "content": "x"}, {"path": "b.md", "content": "y"}])
+        _write_wal(agent, [orjson.dumps({"path": "a.md", "ck": _checksum("x"), "v": agent.index_version})])
+
+        result = asyncio.run(agent.reindex_notes())
+
+        assert agent.processed == ["b.md"]
+        assert result["reindexed_count"] == 1
+        assert result["skipped_count"] == 1
+        assert not os.path.exists(agent.wal_path)
+
+    def test_changed_content_is_reindexed(self, agent):
+        _serve(agent, [{"path": "a.md", "content": "edited"}])
+        _write_wal(agent, [orjson.dumps({"path": "a.md", "ck": _checksum("x"), "v": agent.index_version})])
+
+        asyncio.run(agent.reindex_notes())
+
+        assert agent.processed == ["a.md"]
+
+    def test_failed_run_keeps_successes_for_the_next_run(self, agent):
+        notes = [{"path": "a.md", "content": "x"}, {"path": "b.md", "content": "broken"}]
+        _serve(agent, notes)
+
+        result = asyncio.run(agent.reindex_notes())
+
+        assert len(result["errors"]) == 1
+        assert agent._load_wal() == {("a.md", _checksum("x"))}
+
+        # Only the failed note is retried once it is fixed
+        notes[1]["content"] = "fixed"
+        agent.processed.clear()
+        result = asyncio.run(agent.reindex_notes())
+
+        assert agent.processed == ["b.md"]
+        assert result["errors"] == []
+        assert not os.path.exists(agent.wal_path)
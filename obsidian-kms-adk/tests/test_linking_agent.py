@@ -0,0 +1,66 @@
+"""
+Tests for LinkingAgent link scoring, NumPy and numba paths
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from agents import linking_agent
+from agents.linking_agent import LinkingAgent
+
+
+def _inputs(seed: int, count: int):
+    rng = np.random.default_rng(seed)
+    similar_notes = [
+        {"note_id": f"n{i}", "path": f"n{i}.md", "similarity_score": float(rng.uniform(0.3, 1.0))}
+        for i in range(count)
+    ]
+    entity_connections = {
+        f"n{i}": {
+            "target_note_path": f"n{i}.md",
+            "shared_entities": [
+                {"name": f"e{j}", "type": "CONCEPT", "confidence": float(rng.uniform(0.2, 1.0))}
+                for j in range(int(rng.integers(1, 4)))
+            ]
+        }
+        for i in range(0, count + 20, 2)
+    }
+    return similar_notes, entity_connections
+
+
+def _score(numba_min_candidates: int, similar_notes, entity_connections):
+    agent = LinkingAgent({
+        "numba_min_candidates": numba_min_candidates,
+        "link_confidence_threshold": 0.6,
+        "max_similar_notes": 25
+    })
+    return asyncio.run(agent._combine_and_score_links(similar_notes, entity_connections, "source"))
+
+
+def test_scores_combine_vector_and_average_entity_confidence():
+    similar_notes = [{"note_id": "a", "path": "a.md", "similarity_score": 0.9}]
+    entity_connections = {"a": {"target_note_path": "a.md", "shared_entities": [
+        {"name": "x", "type": "CONCEPT", "confidence": 1.0},
+        {"name": "y", "type": "CONCEPT", "confidence": 0.5},
+    ]}}
+
+    links = _score(10 ** 9, similar_notes, entity_connections)
+
+    assert [link["target_note_id"] for link in links] == ["a"]
+    assert links[0]["confidence"] == pytest.approx(0.6 * 0.9 + 0.4 * 0.75, abs=1e-6)
+
+
+@pytest.mark.skipif(not linking_agent._NUMBA_AVAILABLE, reason="numba is not installed")
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_numba_path_matches_numpy_path(seed):
+    similar_notes, entity_connections = _inputs(seed, 300)
+
+    numpy_links = _score(10 ** 9, similar_notes, entity_connections)
+    numba_links = _score(0, similar_notes, entity_connections)
+
+    assert [link["target_note_id"] for link in numba_links] == [link["target_note_id"] for link in numpy_links]
+    assert [link["confidence"] for link in numba_links] == pytest.approx(
+        [link["confidence"] for link in numpy_links], abs=1e-5
+    )
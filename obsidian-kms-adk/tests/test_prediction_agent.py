@@ -0,0 +1,83 @@
+"""
+Tests for PredictionAgent walk scoring, rank fusion and quick entity extraction
+"""
+
+import pytest
+
+from agents.prediction_agent import PredictionAgent
+
+
+@pytest.fixture
+def agent():
+    return PredictionAgent({"hot_walk_score_scale": 2.0, "graph_walk_hop_decay": 0.5, "rerank_top_k": 3})
+
+
+class TestScoreWalkResults:
+    def test_cold_results_keep_their_score(self, agent):
+        scored = agent._score_walk_results([{"note_id": "a", "score": 7.5, "path": ["s", "x", "a"]}])
+
+        assert scored[0]["score"] == 7.5
+        assert scored[0]["raw_score"] == 7.5
+        assert scored[0]["hops"] == 2
+
+    def test_hot_results_are_scaled_and_decayed_per_hop(self, agent):
+        scored = agent._score_walk_results([{"note_id": "a", "score": 0.8, "hops": 2}], hot=True)
+
+        assert scored[0]["score"] == pytest.approx(2.0 * 0.8 * 0.5 ** 2)
+        assert scored[0]["raw_score"] == 0.8
+
+    def test_hot_negative_cosine_scores_zero(self, agent):
+        scored = agent._score_walk_results([{"note_id": "a", "score": -0.3, "hops": 0}], hot=True)
+
+        assert scored[0]["score"] == 0.0
+
+    def test_missing_fields_are_filled(self, agent):
+        scored = agent._score_walk_results([{"note_id": "a", "score": 1.0}])
+
+        assert scored[0]["hops"] == 0
+        assert scored[0]["path"] is None
+        assert scored[0]["relationship"] is None
+
+
+class TestRrfFuse:
+    def test_candidates_in_several_rankings_rank_first(self, agent):
+        candidates = {note_id: {"note_id": note_id} for note_id in "abc"}
+
+        fused = agent._rrf_fuse(candidates, {"dense": ["a", "b"], "sparse": ["b", "c"], "graph": ["b"]})
+
+        assert [c["note_id"] for c in fused] == ["b", "a", "c"]
+        assert fused[0]["rrf_score"] == pytest.approx(1 / 62 + 1 / 61 + 1 / 61)
+
+    def test_source_weights_apply(self, agent):
+        agent.rrf_weights = {"graph": 3.0}
+        candidates = {note_id: {"note_id": note_id} for note_id in "ab"}
+
+        fused = agent._rrf_fuse(candidates, {"dense": ["a"], "graph": ["b"]})
+
+        assert [c["note_id"] for c in fused] == ["b", "a"]
+
+    def test_output_is_capped_at_rerank_top_k(self, agent):
+        candidates = {str(i): {"note_id": str(i)} for i in range(10)}
+
+        fused = agent._rrf_fuse(candidates, {"dense": list(candidates)})
+
+        assert [c["note_id"] for c in fused] == ["0", "1", "2"]
+
+
+class TestQuickEntities:
+    @pytest.mark.parametrize("query, expected", [
+        ("Process Mining overview", ["Process Mining"]),
+        ("Kubernetes networking", ["Kubernetes"]),
+        ("Rust vs Go", ["Rust", "Go"]),
+        ("Explain Kubernetes networking", ["Kubernetes"]),
+        ("Compare Rust and Go", ["Rust", "Go"]),
+        ("What is GraphQL?", ["GraphQL"]),
+        ('Summarize "deep work" ideas', ["deep work"]),
+        ("How does Apache Kafka relate to Event Sourcing", ["Apache Kafka", "Event Sourcing"]),
+        ("show me everything", []),
+    ])
+    def test_extraction(self, agent, query, expected):
+        assert [entity["name"] for entity in agent._quick_entities(query)] == expected
+
+    def test_duplicates_are_reported_once(self, agent):
+        assert agent._quick_entities("Neo4j and more Neo4j") == [{"name": "Neo4j"}]